@@ -0,0 +1,770 @@
+import argparse
+import asyncio
+import difflib
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import string
+import subprocess
+import sys
+import tracemalloc
+import time
+from suffix_tree import GeneralizedSuffixTree
+from compact_suffix_tree import CompactGeneralizedSuffixTree
+from sharded_suffix_tree import build_parallel
+from suffix_array import GeneralizedSuffixArray
+from encoded_suffix_tree import EncodedGeneralizedSuffixTree
+from suffix_tree import getAlphabetTable, readWords, readChunks
+from query_server import QueryServer
+from substring_search import test
+
+def readWordList(path):
+    return list(readWords(path))
+
+def measureBuild(treeClass, wordList, **kwargs):
+    """
+    Build a tree while tracing allocations
+    @return: (tree, seconds taken, bytes still allocated once the build is done)
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    tree = treeClass(wordList, **kwargs)
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tree, elapsed, after - before
+
+def memory_comparison(wordList, termChar=chr(256)):
+    """
+    Compare the memory held by the object-based and the compact tree built over the same word list
+    @return: list of dict, one per tree kind
+    """
+    inputChars = sum(map(len, wordList))
+    results = []
+    for name, treeClass in [("object", GeneralizedSuffixTree), ("compact", CompactGeneralizedSuffixTree)]:
+        tree, elapsed, nbytes = measureBuild(treeClass, wordList, termChar=termChar)
+        results.append({
+            "tree": name,
+            "build_seconds": elapsed,
+            "bytes": nbytes,
+            "bytes_per_char": nbytes / inputChars,
+        })
+        del tree
+    return results
+
+def samplePatterns(wordList, count, maxLength=4, seed=0):
+    """
+    Random substrings of random words, to be used as queries
+    """
+    rng = random.Random(seed)
+    words = [word for word in wordList if word]
+    patterns = []
+    for _ in range(count):
+        word = rng.choice(words)
+        start = rng.randrange(len(word))
+        patterns.append(word[start:start + rng.randint(1, maxLength)])
+    return patterns
+
+def batch_comparison(wordList, patterns, termChar=chr(256)):
+    """
+    Compare the throughput of match_many against calling match on each pattern
+    @return: list of dict, one per tree kind and query method
+    """
+    results = []
+    for name, treeClass in [("object", GeneralizedSuffixTree), ("compact", CompactGeneralizedSuffixTree)]:
+        tree = treeClass(wordList, termChar=termChar)
+        for method, run in [("match", lambda: [tree.match(p, True) for p in patterns]),
+                            ("match_many", lambda: tree.match_many(patterns, True))]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            results.append({
+                "tree": name,
+                "method": method,
+                "seconds": elapsed,
+                "patterns_per_second": len(patterns) / elapsed,
+            })
+    return results
+
+def parallel_scaling(wordList, workerCounts=(1, 2, 4, 8, 16), sample=100, termChar=chr(256)):
+    """
+    Time the parallel build for each number of workers, and check its matches against a naive scan
+    of the substrings of sample random words
+    @return: list of dict, one per number of workers
+    """
+    results = []
+    for workers in workerCounts:
+        start = time.perf_counter()
+        tree = build_parallel(wordList, workers, termChar=termChar)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "build_seconds": elapsed,
+            "speedup": results[0]["build_seconds"] / elapsed if results else 1.0,
+            "wrong": len(test(wordList, tree, sample)),
+        })
+    return results
+
+def engine_comparison(wordList, patterns, termChar=chr(256)):
+    """
+    Compare build time, memory and query latency of the Ukkonen trees against the suffix array
+    @return: list of dict, one per engine
+    """
+    inputChars = sum(map(len, wordList))
+    results = []
+    engines = [("object", GeneralizedSuffixTree), ("compact", CompactGeneralizedSuffixTree), ("suffix_array", GeneralizedSuffixArray),
+               ("encoded", EncodedGeneralizedSuffixTree)]
+    for name, engineClass in engines:
+        start = time.perf_counter()
+        engine = engineClass(wordList, termChar=termChar, progress_bar=False)
+        buildSeconds = time.perf_counter() - start
+        del engine
+        engine, _, nbytes = measureBuild(engineClass, wordList, termChar=termChar, progress_bar=False)
+
+        latencies = []
+        for pattern in patterns:
+            start = time.perf_counter()
+            engine.match(pattern, True)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results.append({
+            "engine": name,
+            "build_seconds": buildSeconds,
+            "bytes_per_char": nbytes / inputChars,
+            "query_p50_ms": latencies[len(latencies) // 2] * 1000,
+            "query_mean_ms": sum(latencies) / len(latencies) * 1000,
+        })
+        del engine
+    return results
+
+def childrenModes(wordList):
+    """
+    Constructor arguments of GeneralizedSuffixTree for each way of storing the children of a node
+    """
+    table, termChar = getAlphabetTable(wordList)
+    return [
+        ("defaultdict", {"termChar": termChar}),
+        ("list", {"termChar": termChar, "alphabetMax": ord(termChar)}),
+        ("LookupList", {"termChar": termChar, "alphabetLookup": table}),
+    ]
+
+def incremental_comparison(wordList, sizes, batchSize=1000):
+    """
+    Compare adding a batch of words to a tree of each size against rebuilding the tree with them
+    @return: list of dict, one per children mode and size
+    """
+    results = []
+    for size in sizes:
+        base, batch = wordList[:size], wordList[size:size+batchSize]
+        # the alphabet of the base only, so that the batch may bring unseen chars
+        for mode, kwargs in childrenModes(base):
+            tree = GeneralizedSuffixTree(base, progress_bar=False, **kwargs)
+            start = time.perf_counter()
+            tree.add_many(batch)
+            addSeconds = time.perf_counter() - start
+
+            kwargs = dict(kwargs, alphabetLookup=dict(kwargs["alphabetLookup"])) if "alphabetLookup" in kwargs else kwargs
+            start = time.perf_counter()
+            GeneralizedSuffixTree(base + batch, progress_bar=False, **kwargs)
+            rebuildSeconds = time.perf_counter() - start
+            results.append({
+                "mode": mode,
+                "size": size,
+                "batch": len(batch),
+                "add_many_seconds": addSeconds,
+                "rebuild_seconds": rebuildSeconds,
+                "speedup": rebuildSeconds / addSeconds,
+            })
+    return results
+
+def encoded_comparison(wordList, patterns):
+    """
+    Compare build time and query throughput of the encoded tree against the object tree in each children mode
+    @return: list of dict, one per tree
+    """
+    table, termChar = getAlphabetTable(wordList)
+    trees = [(mode, GeneralizedSuffixTree, kwargs) for mode, kwargs in childrenModes(wordList)]
+    trees.append(("encoded", EncodedGeneralizedSuffixTree, {"termChar": termChar, "alphabetLookup": table}))
+    results = []
+    for name, treeClass, kwargs in trees:
+        start = time.perf_counter()
+        tree = treeClass(wordList, progress_bar=False, **kwargs)
+        buildSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for pattern in patterns:
+            tree._locate(pattern)
+        locateSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for pattern in patterns:
+            tree.match(pattern, True)
+        querySeconds = time.perf_counter() - start
+        results.append({
+            "tree": name,
+            "build_seconds": buildSeconds,
+            "locate_per_second": len(patterns) / locateSeconds, # Phase 1 only
+            "patterns_per_second": len(patterns) / querySeconds,
+        })
+        del tree
+    return results
+
+def skewedPatterns(wordList, count, distinct=500, seed=0):
+    """
+    Queries drawn from a few distinct patterns with Zipf weights, the i-th most popular having weight 1/i
+    """
+    distinctPatterns = samplePatterns(wordList, distinct, seed=seed)
+    weights = [1 / (i+1) for i in range(len(distinctPatterns))]
+    return random.Random(seed).choices(distinctPatterns, weights, k=count)
+
+def cache_comparison(wordList, patterns, cacheSizes=(None, 64, 256, 1024), termChar=chr(256)):
+    """
+    Compare the throughput of match with the query cache of each size, None being without the cache
+    @return: list of dict, one per cache size
+    """
+    results = []
+    for cacheSize in cacheSizes:
+        tree = GeneralizedSuffixTree(wordList, termChar=termChar, progress_bar=False)
+        if cacheSize is not None:
+            tree.enable_cache(cacheSize)
+        start = time.perf_counter()
+        for pattern in patterns:
+            tree.match(pattern, True)
+        elapsed = time.perf_counter() - start
+        stats = tree.cache.stats() if tree.cache is not None else {"hit_ratio": 0.0}
+        results.append({
+            "cache": cacheSize or 0,
+            "seconds": elapsed,
+            "patterns_per_second": len(patterns) / elapsed,
+            "hit_ratio": stats["hit_ratio"],
+        })
+    return results
+
+def lazy_comparison(wordList, patterns, limit=20, termChar=chr(256)):
+    """
+    Compare match returning a list against a lazy view, on the whole result and on the first words alphabetically,
+    with and without a layout from finalize
+    @return: list of dict, one per query and whether the tree is finalized
+    """
+    results = []
+    tree = GeneralizedSuffixTree(wordList, termChar=termChar, progress_bar=False)
+    tree._wordRanks("lex") # computed once for all queries, not timed
+    for finalized in (False, True):
+        if finalized:
+            tree.finalize()
+        for name, query in [
+            ("all", lambda pattern, lazy:len(tree.match(pattern, True, lazy=lazy))),
+            (f"first {limit} lex", lambda pattern, lazy:list(tree.match(pattern, True, limit, "lex", lazy=lazy))),
+        ]:
+            timings = {"query": name, "finalized": finalized}
+            for lazy in (False, True):
+                start = time.perf_counter()
+                for pattern in patterns:
+                    query(pattern, lazy)
+                timings["lazy_seconds" if lazy else "list_seconds"] = time.perf_counter() - start
+            timings["speedup"] = timings["list_seconds"] / timings["lazy_seconds"]
+            results.append(timings)
+    return results
+
+# chars of generated corpora, none of which differ only by case so that case insensitive trees see them all
+ASCII_CHARS = string.ascii_lowercase + string.digits + string.punctuation
+UNICODE_START = 0x4e00 # CJK ideographs, which have no case either
+
+def generateCorpus(count, minLength=3, maxLength=12, alphabetSize=26, skew=0.0, unicode=False, seed=0):
+    """
+    Generate a synthetic word list
+    @param alphabetSize: number of distinct chars, at most len(ASCII_CHARS) unless unicode
+    @param skew: exponent of the Zipf distribution of chars, where the i-th char has weight 1/i**skew,
+            so 0 is uniform and 1 is close to natural language
+    @param unicode: whether to use CJK ideographs instead of ascii chars
+    """
+    if unicode:
+        alphabet = [chr(UNICODE_START + i) for i in range(alphabetSize)]
+    elif alphabetSize <= len(ASCII_CHARS):
+        alphabet = list(ASCII_CHARS[:alphabetSize])
+    else:
+        raise ValueError(f"At most {len(ASCII_CHARS)} ascii chars, use unicode for larger alphabets")
+    weights = [1 / (i+1)**skew for i in range(alphabetSize)]
+    rng = random.Random(seed)
+    return ["".join(rng.choices(alphabet, weights, k=rng.randint(minLength, maxLength))) for _ in range(count)]
+
+def suiteEngines(wordList):
+    """
+    Constructor of every engine benchmarked by the suite, with its arguments
+    """
+    table, termChar = getAlphabetTable(wordList)
+    engines = [(mode, GeneralizedSuffixTree, kwargs) for mode, kwargs in childrenModes(wordList)]
+    return engines + [
+        ("compact", CompactGeneralizedSuffixTree, {"termChar": termChar}),
+        ("encoded", EncodedGeneralizedSuffixTree, {"termChar": termChar, "alphabetLookup": table}),
+        ("suffix_array", GeneralizedSuffixArray, {"termChar": termChar}),
+    ]
+
+def percentile(sortedValues, p):
+    return sortedValues[min(int(len(sortedValues) * p / 100), len(sortedValues) - 1)]
+
+def benchmark_suite(wordList, patterns, memory=True, check=20):
+    """
+    Measure every engine over the same word list and queries
+    @param memory: whether to also build once more while tracing allocations, to get the peak memory
+    @param check: number of patterns whose matches are compared against a naive scan
+    @return: list of dict, one per engine
+    """
+    results = []
+    for name, engineClass, kwargs in suiteEngines(wordList):
+        copyArgs = lambda: dict(kwargs, alphabetLookup=dict(kwargs["alphabetLookup"])) if "alphabetLookup" in kwargs else kwargs
+        if memory:
+            tracemalloc.start()
+            engine = engineClass(wordList, progress_bar=False, **copyArgs())
+            peakBytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del engine
+
+        start = time.perf_counter()
+        engine = engineClass(wordList, progress_bar=False, **copyArgs())
+        buildSeconds = time.perf_counter() - start
+
+        latencies = []
+        for pattern in patterns:
+            start = time.perf_counter()
+            engine.match(pattern, True)
+            latencies.append(time.perf_counter() - start)
+        querySeconds = sum(latencies)
+        latencies.sort()
+
+        normalized = [engine.normalize(word) for word in wordList] # the words as the engine stores them
+        wrong = sum(sorted(engine.match(pattern)) != sorted(word for word in normalized if engine.normalize(pattern) in word)
+                    for pattern in patterns[:check])
+        results.append({
+            "engine": name,
+            "build_seconds": buildSeconds,
+            "peak_bytes": peakBytes if memory else None,
+            "nodes": engine.stats().get("nodes"), # None for the suffix array
+            "query_p50_ms": percentile(latencies, 50) * 1000,
+            "query_p90_ms": percentile(latencies, 90) * 1000,
+            "query_p99_ms": percentile(latencies, 99) * 1000,
+            "query_mean_ms": querySeconds / len(latencies) * 1000,
+            "queries_per_second": len(latencies) / querySeconds,
+            "wrong": wrong,
+        })
+        del engine
+    return results
+
+def environment():
+    """
+    What the results depend on besides the corpus, to tell apart runs of the suite across commits
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(), "time": time.time()}
+
+def _serveWords(wordList, max_batch, ports):
+    tree = GeneralizedSuffixTree(wordList, termChar=chr(256), progress_bar=False)
+    server = QueryServer(tree, port=0, max_batch=max_batch)
+    async def run():
+        await server.start()
+        ports.put(server.port)
+        await server.serve_forever()
+    asyncio.run(run())
+
+def generateText(wordList, size, noise=0.5, seed=0):
+    """
+    Text of about size chars made of random words separated by spaces, a fraction noise of which have their chars
+    shuffled so that they are mostly not words
+    """
+    rng = random.Random(seed)
+    words = [word for word in wordList if word]
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        if rng.random() < noise:
+            word = "".join(rng.sample(word, len(word)))
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)
+
+def scan_throughput(wordList, text=None, path=None, chunkSize=1 << 16, engines=None):
+    """
+    Throughput of scan over a text for every engine, against looking up every substring of the text up to the
+    length of the longest word in a dict of the words
+    @param text: str to scan, unless path of a text file is given
+    @param engines: names of the engines to run, default to all
+    @return: list of dict, one per engine
+    """
+    chunks = (lambda: readChunks(path, chunkSize)) if path is not None else \
+             (lambda: (text[k:k+chunkSize] for k in range(0, len(text), chunkSize)))
+    textBytes = sum(len(chunk.encode()) for chunk in chunks())
+    results = []
+    def measure(name, scan):
+        start = time.perf_counter()
+        occurrences = sum(1 for _ in scan())
+        elapsed = time.perf_counter() - start
+        results.append({
+            "engine": name,
+            "seconds": elapsed,
+            "mb_per_second": textBytes / elapsed / 1e6,
+            "occurrences": occurrences,
+        })
+
+    for name, engineClass, kwargs in suiteEngines(wordList):
+        if engines is None or name in engines:
+            engine = engineClass(wordList, progress_bar=False, **kwargs)
+            engine.scan("") # build the word index of the tree, once for all scans
+            measure(name, lambda: engine.scan(chunks()))
+            del engine
+
+    if engines is None or "dict" in engines:
+        wordIDs = {}
+        for wordID, word in enumerate(wordList):
+            if word:
+                wordIDs.setdefault(word.lower(), []).append(wordID)
+        maxLength = max(map(len, wordIDs), default=0)
+        def lookup():
+            tail, start = "", 0
+            for chunk in itertools.chain(chunks(), ("",)):
+                text = tail + chunk.lower()
+                end = len(text) - maxLength if chunk else len(text)
+                for k in range(max(end, 0)):
+                    for m in range(1, min(maxLength, len(text) - k) + 1):
+                        for wordID in wordIDs.get(text[k:k+m], ()):
+                            yield start + k, wordID
+                tail, start = text[max(end, 0):], start + max(end, 0)
+        measure("dict", lookup)
+    return results
+
+def pairwiseLongest(words):
+    """
+    Longest substring shared by two of the words, comparing every pair as the tree makes unnecessary
+    """
+    best = ""
+    for i, a in enumerate(words):
+        for b in words[i+1:]:
+            match = difflib.SequenceMatcher(None, a, b, autojunk=False).find_longest_match(0, len(a), 0, len(b))
+            if match.size > len(best):
+                best = a[match.a:match.a + match.size]
+    return best
+
+def common_substrings_timing(wordList, k=3, minLength=4, sample=1000, engines=None):
+    """
+    Time the annotation of every engine and the common substring queries using it, and compare the longest
+    substring shared by two words of a sample against comparing every pair of them
+    @param engines: names of the engines to run, default to all
+    @return: list of dict, one per engine and the pairwise baseline
+    """
+    results = []
+    sampleIDs = random.Random(0).sample(range(len(wordList)), min(sample, len(wordList)))
+    for name, engineClass, kwargs in suiteEngines(wordList):
+        if engines is not None and name not in engines:
+            continue
+        engine = engineClass(wordList, progress_bar=False, **kwargs)
+        timings = {"engine": name}
+        for key, query in [
+            ("annotate_seconds", engine.annotate),
+            ("lcs_2_seconds", lambda: engine.longest_common_substring(k=2)),
+            (f"common_{k}_seconds", lambda: engine.common_substrings(k, minLength)),
+            (f"sample_{len(sampleIDs)}_lcs_2_seconds", lambda: engine.longest_common_substring(sampleIDs, 2)),
+        ]:
+            start = time.perf_counter()
+            result = query()
+            timings[key] = time.perf_counter() - start
+        timings["sample_lcs_2_length"] = len(result)
+        timings[f"common_{k}"] = len(engine.common_substrings(k, minLength))
+        results.append(timings)
+        del engine
+
+    start = time.perf_counter()
+    best = pairwiseLongest([wordList[wordID].lower() for wordID in sampleIDs])
+    pairwise = dict.fromkeys(results[0] if results else (), None)
+    pairwise.update({"engine": "pairwise", f"sample_{len(sampleIDs)}_lcs_2_seconds": time.perf_counter() - start,
+                     "sample_lcs_2_length": len(best)})
+    results.append(pairwise)
+    return results
+
+def typoPatterns(wordList, count, minLength=4, maxLength=8, wildcard="?", seed=0):
+    """
+    Substrings of random words with one random typo or wildcard each, as a user would mistype them
+    """
+    rng = random.Random(seed)
+    words = [word for word in wordList if len(word) >= minLength]
+    patterns = []
+    for _ in range(count):
+        word = rng.choice(words)
+        length = rng.randint(minLength, min(maxLength, len(word)))
+        start = rng.randrange(len(word) - length + 1)
+        pattern = word[start:start + length]
+        i = rng.randrange(len(pattern))
+        typo = rng.choice(["delete", "insert", "substitute", "wildcard"])
+        c = rng.choice(pattern)
+        patterns.append({"delete": pattern[:i] + pattern[i+1:], "insert": pattern[:i] + c + pattern[i:],
+                         "substitute": pattern[:i] + c + pattern[i+1:], "wildcard": pattern[:i] + wildcard + pattern[i+1:]}[typo])
+    return patterns
+
+def fuzzy_latency(wordList, patterns, editCounts=(1, 2), maxMatches=None, engines=None):
+    """
+    Latency of match_fuzzy on every engine for each max number of edits
+    @param maxMatches: limit of each query, as an interactive user only looks at the first matches
+    @param engines: names of the engines to run, default to all
+    @return: list of dict, one per engine and number of edits
+    """
+    results = []
+    for name, engineClass, kwargs in suiteEngines(wordList):
+        if engines is not None and name not in engines:
+            continue
+        engine = engineClass(wordList, progress_bar=False, **kwargs)
+        for k in editCounts:
+            latencies, matches = [], 0
+            for pattern in patterns:
+                start = time.perf_counter()
+                matches += len(engine.match_fuzzy(pattern, k, maxMatches))
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            results.append({
+                "engine": name,
+                "max_edits": k,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p90_ms": percentile(latencies, 90) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "mean_matches": matches / len(patterns),
+            })
+        del engine
+    return results
+
+def startServer(wordList, max_batch=256):
+    """
+    Serve a tree of the words on any free port, from another process so that the clients do not hold its GIL
+    @return: (server process, port)
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serveWords, args=(wordList, max_batch, ports), daemon=True)
+    process.start()
+    return process, ports.get()
+
+async def loadClient(port, patterns, depth, latencies):
+    """
+    Send match requests over one connection, keeping up to depth of them in flight
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    window = asyncio.Semaphore(depth)
+    sent = {} # id -> time sent
+    async def receive():
+        for _ in patterns:
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(response["id"]))
+            window.release()
+    receiving = asyncio.create_task(receive())
+    for i, pattern in enumerate(patterns):
+        await window.acquire()
+        sent[i] = time.perf_counter()
+        writer.write(json.dumps({"id": i, "pattern": pattern, "ret_match_index": True}).encode() + b"\n")
+        await writer.drain()
+    await receiving
+    writer.close()
+
+async def loadWriter(port, words, chunkSize=100):
+    """
+    Add the words over one connection, a chunk at a time, while the clients query
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(0, len(words), chunkSize):
+        writer.write(json.dumps({"id": i, "op": "add", "words": words[i:i+chunkSize]}).encode() + b"\n")
+        await writer.drain()
+        await reader.readline()
+    writer.close()
+
+def load_test(wordList, patterns, connectionCounts=(1, 4, 16), depth=8, addWords=0, max_batch=256):
+    """
+    Latency and throughput of the query server under concurrent connections, each pipelining depth requests
+    @param addWords: number of generated words added through another connection during each run
+    @return: list of dict, one per number of connections
+    """
+    process, port = startServer(wordList, max_batch)
+    results = []
+    for connections in connectionCounts:
+        latencies = []
+        async def run():
+            clients = [loadClient(port, patterns[i::connections], depth, latencies) for i in range(connections)]
+            if addWords:
+                clients.append(loadWriter(port, generateCorpus(addWords, seed=connections)))
+            await asyncio.gather(*clients)
+        start = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        results.append({
+            "connections": connections,
+            "depth": depth,
+            "added_words": addWords,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "requests_per_second": len(latencies) / elapsed,
+        })
+    process.terminate()
+    return results
+
+def printTable(rows):
+    keys = list(rows[0].keys())
+    print("\t".join(keys))
+    for row in rows:
+        print("\t".join(f"{row[k]:.3f}" if isinstance(row[k], float) else str(row[k]) for k in keys))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmarks for the generalized suffix tree.')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    memory = subparsers.add_parser("memory", help="Compare the memory of the object-based and the compact tree.")
+    memory.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    memory.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+
+    batch = subparsers.add_parser("batch", help="Compare match_many against looping over match.")
+    batch.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    batch.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    batch.add_argument("-q", "--queries", type=int, default=10000, help="Number of patterns in the batch.")
+
+    parallel = subparsers.add_parser("parallel", help="Scaling of the parallel build with the number of workers.")
+    parallel.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    parallel.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    parallel.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Numbers of workers to try.")
+    parallel.add_argument("-s", "--sample", type=int, default=100, help="Number of words whose substrings are checked against a naive scan.")
+
+    engines = subparsers.add_parser("engines", help="Compare the Ukkonen trees against the suffix array.")
+    engines.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    engines.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    engines.add_argument("-q", "--queries", type=int, default=1000, help="Number of queries to time.")
+
+    incremental = subparsers.add_parser("incremental", help="Compare add_many against rebuilding the tree.")
+    incremental.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    incremental.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    incremental.add_argument("-s", "--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Sizes of the tree before adding.")
+    incremental.add_argument("-b", "--batch", type=int, default=1000, help="Number of words added.")
+
+    encoded = subparsers.add_parser("encoded", help="Compare the encoded tree against the object tree in each children mode.")
+    encoded.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    encoded.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    encoded.add_argument("-q", "--queries", type=int, default=1000, help="Number of queries to time.")
+
+    cache = subparsers.add_parser("cache", help="Throughput of match with the query cache on a skewed workload.")
+    cache.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    cache.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    cache.add_argument("-q", "--queries", type=int, default=10000, help="Number of queries.")
+    cache.add_argument("-d", "--distinct", type=int, default=500, help="Number of distinct patterns in the queries.")
+
+    lazy = subparsers.add_parser("lazy", help="Compare match returning a list against a lazy view, on broad patterns.")
+    lazy.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    lazy.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    lazy.add_argument("-q", "--queries", type=int, default=200, help="Number of queries.")
+    lazy.add_argument("-m", "--max-length", type=int, default=2, help="Max length of the patterns, the shorter the more words they match.")
+    lazy.add_argument("-k", "--first", type=int, default=20, help="Number of words of the sorted queries.")
+
+    load = subparsers.add_parser("load", help="Latency of the query server under concurrent pipelined connections.")
+    load.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    load.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    load.add_argument("-q", "--queries", type=int, default=10000, help="Number of queries, split among the connections.")
+    load.add_argument("-c", "--connections", type=int, nargs="+", default=[1, 4, 16], help="Numbers of connections to try.")
+    load.add_argument("-d", "--depth", type=int, default=8, help="Number of requests in flight per connection.")
+    load.add_argument("-a", "--add", type=int, default=0, help="Number of words added by another connection during each run.")
+    load.add_argument("-b", "--batch", type=int, default=256, help="Max number of requests the server runs together.")
+
+    scan = subparsers.add_parser("scan", help="Throughput of scanning a text for the words, in MB/s.")
+    scan.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    scan.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    scan.add_argument("-t", "--text", type=str, default=None, help="Path of the text to scan, otherwise a text is generated from the words.")
+    scan.add_argument("-s", "--size", type=int, default=1000000, help="Number of chars of the generated text.")
+    scan.add_argument("-c", "--chunk", type=int, default=1 << 16, help="Number of chars read at a time.")
+    scan.add_argument("-e", "--engines", type=str, nargs="+", default=None, help="Names of the engines to run, dict being the baseline.")
+
+    def addCorpusArguments(subparser):
+        subparser.add_argument("-w", "--words", type=int, default=10000, help="Number of words to generate.")
+        subparser.add_argument("-min", "--min-length", type=int, default=3, help="Min length of a generated word.")
+        subparser.add_argument("-max", "--max-length", type=int, default=12, help="Max length of a generated word.")
+        subparser.add_argument("-a", "--alphabet", type=int, default=26, help="Number of distinct chars in generated words.")
+        subparser.add_argument("-z", "--skew", type=float, default=0.0, help="Zipf exponent of the char distribution, 0 for uniform.")
+        subparser.add_argument("-u", "--unicode", action='store_true', help="Generate CJK chars instead of ascii chars.")
+        subparser.add_argument("--seed", type=int, default=0, help="Seed of the generator.")
+
+    corpus = subparsers.add_parser("corpus", help="Write a generated word list, to be used by the other benchmarks.")
+    corpus.add_argument("output", type=str, help="Path of the word list file to write.")
+    addCorpusArguments(corpus)
+
+    suite = subparsers.add_parser("suite", help="Build time, memory, nodes and query latency of every engine, optionally as JSON.")
+    suite.add_argument("path", type=str, nargs="?", default=None, help="Path to a word list file, otherwise a corpus is generated.")
+    suite.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    addCorpusArguments(suite)
+    suite.add_argument("-q", "--queries", type=int, default=1000, help="Number of queries to time.")
+    suite.add_argument("-d", "--distinct", type=int, default=None, help="Draw the queries from this many distinct patterns with Zipf weights.")
+    suite.add_argument("-nm", "--no-memory", action='store_true', help="Skip the build traced for peak memory, which is slow.")
+    suite.add_argument("-j", "--json", type=str, default=None, help="Write the results as JSON to this path, - for stdout.")
+
+    common = subparsers.add_parser("common", help="Time of the common substring queries, against comparing every pair of words.")
+    common.add_argument("path", type=str, nargs="?", default=None, help="Path to a word list file, otherwise a corpus is generated.")
+    common.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    addCorpusArguments(common)
+    common.add_argument("-k", type=int, default=3, help="Number of words a substring must be in.")
+    common.add_argument("-l", "--length", type=int, default=4, help="Min length of the substrings in at least k words.")
+    common.add_argument("-s", "--sample", type=int, default=1000, help="Number of words compared pairwise.")
+    common.add_argument("-e", "--engines", type=str, nargs="+", default=None, help="Names of the engines to run.")
+
+    fuzzy = subparsers.add_parser("fuzzy", help="Latency of approximate matching for each max number of edits.")
+    fuzzy.add_argument("path", type=str, nargs="?", default=None, help="Path to a word list file, otherwise a corpus is generated.")
+    fuzzy.add_argument("-n", "--limit", type=int, default=None, help="Only use the first n words.")
+    addCorpusArguments(fuzzy)
+    fuzzy.add_argument("-q", "--queries", type=int, default=100, help="Number of queries to time, each with one typo.")
+    fuzzy.add_argument("-k", "--edits", type=int, nargs="+", default=[1, 2], help="Max numbers of edits to time.")
+    fuzzy.add_argument("-m", "--max-matches", type=int, default=None, help="Limit of each query.")
+    fuzzy.add_argument("-e", "--engines", type=str, nargs="+", default=None, help="Names of the engines to run.")
+
+    opt = parser.parse_args()
+
+    generated = lambda: generateCorpus(opt.words, opt.min_length, opt.max_length, opt.alphabet, opt.skew, opt.unicode, opt.seed)
+    if opt.command == "corpus":
+        with open(opt.output, "w", encoding="utf-8") as f:
+            f.writelines(word + "\n" for word in generated())
+        sys.exit()
+
+    wordList = (readWordList(opt.path) if opt.path else generated())[:opt.limit]
+    print(f"{len(wordList)} words, {sum(map(len, wordList))} chars", file=sys.stderr if opt.command == "suite" and opt.json == "-" else sys.stdout)
+
+    if opt.command == "suite":
+        patterns = samplePatterns(wordList, opt.queries) if opt.distinct is None else skewedPatterns(wordList, opt.queries, opt.distinct)
+        results = benchmark_suite(wordList, patterns, not opt.no_memory)
+        if opt.json is None:
+            printTable(results)
+        else:
+            corpusInfo = {"path": opt.path, "words": len(wordList), "chars": sum(map(len, wordList))}
+            if not opt.path:
+                corpusInfo.update(min_length=opt.min_length, max_length=opt.max_length, alphabet=opt.alphabet,
+                                  skew=opt.skew, unicode=opt.unicode, seed=opt.seed)
+            report = {"environment": environment(), "corpus": corpusInfo,
+                      "queries": {"count": len(patterns), "distinct": opt.distinct}, "results": results}
+            with (open(opt.json, "w") if opt.json != "-" else sys.stdout) as f:
+                json.dump(report, f, indent=2)
+    elif opt.command == "memory":
+        printTable(memory_comparison(wordList))
+    elif opt.command == "batch":
+        printTable(batch_comparison(wordList, samplePatterns(wordList, opt.queries)))
+    elif opt.command == "parallel":
+        printTable(parallel_scaling(wordList, opt.workers, opt.sample))
+    elif opt.command == "engines":
+        printTable(engine_comparison(wordList, samplePatterns(wordList, opt.queries)))
+    elif opt.command == "incremental":
+        printTable(incremental_comparison(wordList, opt.sizes, opt.batch))
+    elif opt.command == "encoded":
+        printTable(encoded_comparison(wordList, samplePatterns(wordList, opt.queries)))
+    elif opt.command == "cache":
+        printTable(cache_comparison(wordList, skewedPatterns(wordList, opt.queries, opt.distinct)))
+    elif opt.command == "lazy":
+        printTable(lazy_comparison(wordList, samplePatterns(wordList, opt.queries, opt.max_length), opt.first))
+    elif opt.command == "scan":
+        printTable(scan_throughput(wordList, None if opt.text else generateText(wordList, opt.size), opt.text, opt.chunk, opt.engines))
+    elif opt.command == "common":
+        printTable(common_substrings_timing(wordList, opt.k, opt.length, opt.sample, opt.engines))
+    elif opt.command == "fuzzy":
+        printTable(fuzzy_latency(wordList, typoPatterns(wordList, opt.queries), opt.edits, opt.max_matches, opt.engines))
+    elif opt.command == "load":
+        printTable(load_test(wordList, samplePatterns(wordList, opt.queries), opt.connections, opt.depth, opt.add, opt.batch))
@@ -0,0 +1,423 @@
+from suffix_tree import GeneralizedSuffixTree, MatchLayout
+from array import array
+import codecs
+import json
+import mmap
+import struct
+import sys
+
+ROOT = 0 # the root is always the first node in the store
+NONE = -1 # null index, for a missing node/origin
+
+# index file layout: header, json metadata, then every array aligned to ALIGNMENT bytes
+INDEX_MAGIC = b"GSTI"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sII") # magic, version, metadata size
+ALIGNMENT = 8
+
+class NodeStore:
+    """
+    Parallel typed arrays holding every node of a compact tree, such that a node is just an index into them.
+    Children of a node are kept as a first-child/next-sibling linked list, so each node costs a fixed number of
+    machine ints regardless of the size of the alphabet.
+    """
+    typecode = 'i'
+    names = ("istart", "iend", "wordID", "char", "link", "firstChild", "nextSibling",
+             "originHead", "originWord", "originSuffix", "originNext")
+
+    def __init__(self):
+        t = self.typecode
+        # per node
+        self.istart = array(t)
+        self.iend = array(t)
+        self.wordID = array(t)      # the word that the chars of the edge are taken from
+        self.char = array(t)        # code of the first char on the edge, to find a child among its siblings
+        self.link = array(t)        # only internal node (non-root and non-leaf) has link
+        self.firstChild = array(t)
+        self.nextSibling = array(t)
+        self.originHead = array(t)  # head of the suffix origin list, NONE for non-leaf
+        # per suffix origin, as linked list
+        self.originWord = array(t)
+        self.originSuffix = array(t)
+        self.originNext = array(t)
+
+    def __len__(self):
+        return len(self.istart)
+
+    def arrays(self):
+        return [getattr(self, name) for name in self.names]
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in self.arrays())
+
+    def newNode(self, wordID, istart, iend, char):
+        node = len(self.istart)
+        self.istart.append(istart)
+        self.iend.append(iend)
+        self.wordID.append(wordID)
+        self.char.append(char)
+        self.link.append(NONE)
+        self.firstChild.append(NONE)
+        self.nextSibling.append(NONE)
+        self.originHead.append(NONE)
+        return node
+
+    def newOrigin(self, wordID, suffixIndex, nextOrigin=NONE):
+        origin = len(self.originWord)
+        self.originWord.append(wordID)
+        self.originSuffix.append(suffixIndex)
+        self.originNext.append(nextOrigin)
+        return origin
+
+class MappedWordList:
+    """
+    Read-only view of the preprocessed words of an index file, with all words concatenated in a UTF-32 buffer.
+    A word is only decoded into a str when accessed.
+    """
+    def __init__(self, text, offsets):
+        """
+        @param text: bytes-like buffer of the concatenated words encoded in UTF-32-LE
+        @param offsets: start of each word in text, in chars, with the end of the last word appended
+        """
+        self.text = text
+        self.offsets = offsets
+    def __len__(self):
+        return len(self.offsets) - 1
+    def __getitem__(self, wordID):
+        return codecs.utf_32_le_decode(self.text[4*self.offsets[wordID]:4*self.offsets[wordID+1]])[0]
+    def charAt(self, wordID, k):
+        start = 4 * (self.offsets[wordID] + k)
+        return codecs.utf_32_le_decode(self.text[start:start+4])[0]
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+class CompactGeneralizedSuffixTree(GeneralizedSuffixTree):
+    """
+    Generalized Suffix Tree whose nodes live in a NodeStore instead of one SuffixTreeNode object each,
+    trading a linear scan over the siblings on child lookup for a much smaller memory footprint.
+
+    alphabetMax and alphabetLookup are accepted for compatibility, but have no effect as no child table is allocated.
+    """
+
+    _storageAttributes = ("root", "store", "layout")
+
+    def _initStorage(self):
+        self.root = ROOT
+        self.store = NodeStore()
+        self.store.newNode(NONE, NONE, NONE, NONE)
+        self.store.link[ROOT] = ROOT # root link to itself
+
+    ## node functions, the counterpart of SuffixTreeNode methods
+
+    def getChild(self, node, char):
+        """
+        @param char: code of the first char on the edge of the child
+        @return: the child, or NONE if there is none
+        """
+        store = self.store
+        chars, nextSibling = store.char, store.nextSibling
+        child = store.firstChild[node]
+        while child != NONE and chars[child] != char:
+            child = nextSibling[child]
+        return child
+
+    def setChild(self, node, char, newChild):
+        """
+        Replace the child starting with char if there is one, otherwise prepend newChild to the children
+        """
+        store = self.store
+        chars, nextSibling = store.char, store.nextSibling
+        prev = NONE
+        child = store.firstChild[node]
+        while child != NONE and chars[child] != char:
+            prev = child
+            child = nextSibling[child]
+        if child == NONE:
+            nextSibling[newChild] = store.firstChild[node]
+            store.firstChild[node] = newChild
+        else:
+            nextSibling[newChild] = nextSibling[child]
+            if prev == NONE:
+                store.firstChild[node] = newChild
+            else:
+                nextSibling[prev] = newChild
+
+    def getChildren(self, node):
+        nextSibling = self.store.nextSibling
+        child = self.store.firstChild[node]
+        while child != NONE:
+            yield child
+            child = nextSibling[child]
+
+    def isLeaf(self, node):
+        return self.store.originHead[node] != NONE
+
+    def getEdgeSize(self, node):
+        return self.store.iend[node] - self.store.istart[node] + 1
+
+    def addSuffixOrigin(self, node, wordID, suffixIndex): # NOTE: GST extension
+        store = self.store
+        head = store.originHead[node]
+        if head == NONE: # not a leaf
+            return
+        # insert right after the head, as the head is the one the edge chars are taken from
+        store.originNext[head] = store.newOrigin(wordID, suffixIndex, store.originNext[head])
+
+    ## node protocol
+
+    def _nodeChildren(self, node):
+        return self.getChildren(node)
+
+    def _nodeOrigins(self, node):
+        store = self.store
+        origin = store.originHead[node]
+        while origin != NONE:
+            yield store.originWord[origin], store.originSuffix[origin]
+            origin = store.originNext[origin]
+
+    def _nodeRank(self, node):
+        return self.layout.rankOf[node]
+
+    def _setNodeRank(self, layout, node, rank):
+        layout.rankOf[node] = rank
+
+    def _newLayout(self):
+        layout = MatchLayout()
+        layout.rankOf = array(NodeStore.typecode, [NONE]) * len(self.store) # node -> rank
+        return layout
+
+    def _nodeBytes(self, node):
+        itemsize = array(NodeStore.typecode).itemsize
+        return itemsize * sum(1 for name in NodeStore.names if not name.startswith("origin") or name == "originHead")
+
+    def _originBytes(self):
+        itemsize = array(NodeStore.typecode).itemsize
+        return itemsize * sum(1 for name in NodeStore.names if name.startswith("origin") and name != "originHead")
+
+    ## tree functions
+
+    def _nodeChild(self, node, symbol):
+        child = self.getChild(node, ord(symbol))
+        return None if child == NONE else child
+
+    def _nodeEdge(self, node):
+        store = self.store
+        return self.wordList[store.wordID[node]], store.istart[node], store.iend[node]
+
+    def _nodeLink(self, node):
+        return self.store.link[node]
+
+    def _renameTermEdges(self, oldTermChar, newTermChar):
+        chars = self.store.char
+        oldCode, newCode = ord(oldTermChar), ord(newTermChar)
+        for node in range(len(chars)):
+            if chars[node] == oldCode:
+                chars[node] = newCode
+
+    def _locate(self, pattern, path=None):
+        store = self.store
+        istarts, iends, wordIDs = store.istart, store.iend, store.wordID
+        pWordList = self.wordList
+        i, currNode = path[-1] if path else (0, ROOT)
+        counters = self.counters
+        while i < len(pattern):
+            child = self.getChild(currNode, ord(pattern[i]))
+            if child == NONE:
+                return None # no match
+            if counters is not None:
+                counters.nodes_visited += 1
+            istart = istarts[child]
+            edgeSize = iends[child] - istart + 1
+            cmplen = min(len(pattern) - i, edgeSize) # comparison length
+            if pattern[i:i+cmplen] != pWordList[wordIDs[child]][istart:istart+cmplen]:
+                return None
+            i += cmplen
+            currNode = child
+            if path is not None and cmplen == edgeSize:
+                path.append((i, currNode))
+        return currNode
+
+    def _getMatch(self, startNode, result_accumulator):
+        store = self.store
+        firstChild, nextSibling, originHead = store.firstChild, store.nextSibling, store.originHead
+        originWord, originSuffix, originNext = store.originWord, store.originSuffix, store.originNext
+        visited = scanned = 0
+        stack = [startNode]
+        while stack:
+            node = stack.pop()
+            visited += 1
+            origin = originHead[node]
+            if origin != NONE: # leaf
+                scanned += 1
+                while origin != NONE:
+                    wordID = originWord[origin]
+                    suffixIndex = originSuffix[origin]
+                    if wordID not in result_accumulator or suffixIndex < result_accumulator[wordID]:
+                        result_accumulator[wordID] = suffixIndex
+                    origin = originNext[origin]
+            else:
+                child = firstChild[node]
+                while child != NONE:
+                    stack.append(child)
+                    child = nextSibling[child]
+        if self.counters is not None:
+            self.counters.add(nodes_visited=visited, leaves_scanned=scanned)
+        return result_accumulator
+
+    def _edgeSymbol(self, node, k):
+        store = self.store
+        return self.wordList.charAt(store.wordID[node], store.istart[node] + k)
+
+    def _edgeSize(self, node):
+        return self.getEdgeSize(node)
+
+    def _addNodeOrigin(self, node, wordID, suffixIndex):
+        self.addSuffixOrigin(node, wordID, suffixIndex)
+
+    def _setNodeLink(self, node, linkedNode):
+        self.store.link[node] = linkedNode
+
+    def createLeaf(self, wordID, sourceNode, istart, suffixIndex, firstChar, lastIndex):
+        store = self.store
+        firstChar = ord(firstChar) # as a code in the store
+        leaf = store.newNode(wordID, istart, lastIndex, firstChar)
+        store.originHead[leaf] = store.newOrigin(wordID, suffixIndex)
+        self.setChild(sourceNode, firstChar, leaf)
+        return leaf
+
+    def splitEdge(self, currNode, parentNode, conflictIndex, goodCount, suffixIndex, wordID, currWord):
+        store = self.store
+        existingWordID = store.wordID[currNode]
+        currStart = store.istart[currNode]
+
+        # create the 2 new nodes
+        internalNode = store.newNode(existingWordID, currStart, currStart + goodCount - 1, store.char[currNode])
+        self.createLeaf(wordID, internalNode, conflictIndex, suffixIndex, currWord[conflictIndex], len(currWord) - 1)
+
+        # link the created internal node, taking the place of currNode among its siblings
+        self.setChild(parentNode, store.char[internalNode], internalNode)
+
+        # make changes to currNode and link to internal node
+        store.istart[currNode] = currStart + goodCount
+        store.char[currNode] = ord(self.wordList.charAt(existingWordID, currStart + goodCount))
+        self.setChild(internalNode, store.char[currNode], currNode)
+
+        return internalNode
+
+    def walkDown(self, startNode, iend, skipCount, currWord):
+        store = self.store
+        istarts, iends = store.istart, store.iend
+
+        istart = iend - skipCount
+        remainingSkip = skipCount
+        currNode = startNode
+        parentNode = NONE
+
+        # skip if necassary
+        while remainingSkip > 0:
+            childNode = self.getChild(currNode, ord(currWord[istart]))
+            childLength = iends[childNode] - istarts[childNode] + 1 # edge length
+
+            # traverse down
+            parentNode = currNode
+            currNode = childNode
+
+            if remainingSkip < childLength:
+                break
+
+            istart += childLength
+            remainingSkip -= childLength
+
+        return currNode, parentNode, remainingSkip
+
+    ## persistence
+
+    def save(self, path):
+        """
+        Write the tree into an index file that can be memory-mapped back by load(), including its layout if finalized
+        """
+        text = "".join(self.wordList).encode("utf-32-le")
+        offsets = array('q', [0])
+        for word in self.wordList:
+            offsets.append(offsets[-1] + len(word))
+
+        sections = [(name, getattr(self.store, name)) for name in NodeStore.names]
+        sections.append(("offsets", offsets))
+        if self.layout is not None:
+            sections += [("layout." + name, getattr(self.layout, name)) for name in MatchLayout.names + ("rankOf",)]
+        meta = {
+            "byteorder": sys.byteorder,
+            "termChar": self.termChar,
+            "case_sensitive": self.case_sensitive,
+            "alphabetMax": self.alphabetMax,
+            "alphabetLookup": sorted(self.alphabetLookup.items()) if self.alphabetLookup else None,
+            "layoutOrder": self.layout.order if self.layout is not None else None,
+            "removed": sorted(self.removed),
+            "garbage": sorted(self.garbage),
+            "sections": [(name, a.typecode, len(a)) for name, a in sections] + [("text", "B", len(text))],
+        }
+        meta = json.dumps(meta).encode("utf-8")
+
+        with open(path, "wb") as f:
+            pad = lambda: f.write(b"\0" * (-f.tell() % ALIGNMENT))
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(meta)))
+            f.write(meta)
+            for _, a in sections:
+                pad()
+                a.tofile(f)
+            pad()
+            f.write(text)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-map an index file written by save().
+        The arrays are used directly from the mapped file without being copied, so loading is instant, and processes
+        loading the same file share the same physical memory. The loaded tree is read-only.
+        """
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, metaSize = INDEX_HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a suffix tree index file")
+        if version != INDEX_VERSION:
+            raise ValueError(f"Unsupported index file version {version}, expected {INDEX_VERSION}")
+        offset = INDEX_HEADER.size
+        meta = json.loads(bytes(buffer[offset:offset+metaSize]).decode("utf-8"))
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Index file was written on a {meta['byteorder']} endian machine")
+        offset += metaSize
+
+        view = memoryview(buffer)
+        sections = {}
+        for name, typecode, length in meta["sections"]:
+            offset += -offset % ALIGNMENT
+            nbytes = length * array(typecode).itemsize
+            sections[name] = view[offset:offset+nbytes].cast(typecode)
+            offset += nbytes
+
+        tree = cls.__new__(cls)
+        tree.termChar = meta["termChar"]
+        tree.case_sensitive = meta["case_sensitive"]
+        tree.alphabetMax = meta["alphabetMax"]
+        tree.alphabetLookup = dict(meta["alphabetLookup"]) if meta["alphabetLookup"] else None
+        tree.root = ROOT
+        tree.store = NodeStore.__new__(NodeStore)
+        for name in NodeStore.names:
+            setattr(tree.store, name, sections[name])
+        tree.wordList = MappedWordList(sections["text"], sections["offsets"])
+        tree._initState()
+        tree.removed, tree.garbage = set(meta.get("removed", ())), set(meta.get("garbage", ()))
+        tree.layout = None
+        if "layout.rankOf" in sections: # NOTE: the leaf sections of files written by older versions are ignored
+            tree.layout = MatchLayout.__new__(MatchLayout)
+            for name in MatchLayout.names + ("rankOf",):
+                setattr(tree.layout, name, sections["layout." + name])
+            tree.layout.order = meta["layoutOrder"]
+        return tree
+
+    def add_many(self, words, progress_bar=False):
+        if isinstance(self.wordList, MappedWordList):
+            raise TypeError("Tree loaded from an index file is read-only")
+        super().add_many(words, progress_bar)
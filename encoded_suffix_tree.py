@@ -0,0 +1,199 @@
+from suffix_tree import GeneralizedSuffixTree, SuffixTreeNode, caseFreeChar
+from array import array
+import sys
+
+TERM = 0 # code of the terminating char, whichever char it is
+UNKNOWN = sys.maxsize # code of a char of a scanned text that is in no word, beyond any child list
+
+class EncodedNode:
+    """
+    Node of an encoded tree, where istart and iend index the concatenated codes of all words instead of a word,
+    and children is a list indexed by the code of the first char of their edge, which only grows as long as the
+    largest code among them
+    """
+    __slots__ = ("istart", "iend", "children", "link", "suffixOrigin", "_lastSuffixOrigin", "rank")
+
+    def __init__(self, istart=None, iend=None, wordID=None, suffixIndex=None):
+        self.istart = istart
+        self.iend = iend
+        self.link = None
+        self.rank = None
+        if wordID is None: # internal node
+            self.children = []
+            self.suffixOrigin = self._lastSuffixOrigin = None
+        else: # A LEAF IS ALWAYS A LEAF
+            self.children = None
+            self.suffixOrigin = self._lastSuffixOrigin = SuffixTreeNode.SuffixOrigin(wordID, suffixIndex)
+
+    def isLeaf(self):
+        return self.children is None
+    def getEdgeSize(self):
+        return self.iend - self.istart + 1
+
+    def addSuffixOrigin(self, wordID, suffixIndex): # NOTE: GST extension
+        newSuffixOrigin = SuffixTreeNode.SuffixOrigin(wordID, suffixIndex)
+        self._lastSuffixOrigin.next = newSuffixOrigin
+        self._lastSuffixOrigin = newSuffixOrigin
+
+    def getChild(self, code):
+        children = self.children
+        return children[code] if code < len(children) else None
+
+    def setChild(self, code, newChild):
+        children = self.children
+        if code >= len(children):
+            children.extend([None] * (code + 1 - len(children)))
+        children[code] = newChild
+
+    def getChildren(self):
+        return filter(None, self.children or ())
+
+class EncodedGeneralizedSuffixTree(GeneralizedSuffixTree):
+    """
+    Generalized Suffix Tree over the words converted once into integer codes, all stored in one array, so that
+    building and matching compare ints and index lists with them instead of calling ord on str chars.
+    Chars are given the codes 1, 2, ... in the order of the alphabet lookup table if any, then in the order they
+    are first seen, and the terminating char is always TERM, so replacing it leaves the tree untouched.
+    Patterns are encoded once per query, and a char never seen is a mismatch before any traversal.
+    """
+
+    def __init__(self, wordList, termChar="$", alphabetLookup=None, **kwargs):
+        """
+        @param alphabetLookup: {ord(char):index} as returned by getAlphabetTable, to number the chars in that order
+        @param kwargs: other arguments of GeneralizedSuffixTree, where alphabetMax has no effect
+        """
+        if not kwargs.get("case_sensitive"):
+            termChar = caseFreeChar(termChar) # same as GeneralizedSuffixTree.__init__
+        self.alphabet = {termChar: TERM} # char -> code
+        alphabetLookup = alphabetLookup or {}
+        for o in sorted(alphabetLookup, key=alphabetLookup.get):
+            self.alphabet.setdefault(chr(o), len(self.alphabet))
+        self.codes = array('I') # codes of all preprocessed words, concatenated
+        self.codeStarts = array('q', [0]) # start of every word in codes, with the total length appended
+        kwargs.pop("alphabetMax", None)
+        super().__init__(wordList, termChar, **kwargs)
+
+    def _initStorage(self):
+        self.root = EncodedNode()
+        self.root.link = self.root # root link to itself
+
+    def _nodeBytes(self, node):
+        return sys.getsizeof(node) + (sys.getsizeof(node.children) if node.children is not None else 0)
+
+    def encode(self, pattern):
+        """
+        @return: list of the codes of the chars of pattern, or None if any of them is not in the alphabet
+        """
+        alphabet = self.alphabet
+        try:
+            return [alphabet[c] for c in pattern]
+        except KeyError:
+            return None
+
+    def _encodeWords(self):
+        """
+        Append the codes of the words not encoded yet, giving the next codes to the chars never seen
+        """
+        alphabet, codes, codeStarts = self.alphabet, self.codes, self.codeStarts
+        for wordID in range(len(codeStarts) - 1, len(self.wordList)):
+            word = self.wordList[wordID]
+            encoded = self.encode(word)
+            if encoded is None:
+                for c in word:
+                    alphabet.setdefault(c, len(alphabet))
+                encoded = self.encode(word)
+            codes.extend(encoded)
+            codeStarts.append(len(codes))
+
+    def _nodeEdge(self, node):
+        return self.codes, node.istart, node.iend
+
+    def _scanSymbols(self, text):
+        alphabet = self.alphabet
+        return [alphabet.get(c, UNKNOWN) for c in self.normalize(text)]
+
+    def _renameTermEdges(self, oldTermChar, newTermChar):
+        """
+        Edges only hold TERM, so only the alphabet changes: the old terminating char gets a code when first seen
+        """
+        del self.alphabet[oldTermChar]
+        self.alphabet[newTermChar] = TERM
+
+    ## tree functions
+
+    def _locate(self, pattern, path=None):
+        i, currNode = path[-1] if path else (0, self.root)
+        encoded = self.encode(pattern)
+        if encoded is None:
+            return None
+        codes = self.codes
+        counters = self.counters
+        m = len(encoded)
+        while i < m:
+            children = currNode.children
+            code = encoded[i]
+            if children is None or code >= len(children) or children[code] is None:
+                return None # no match
+            currNode = children[code]
+            if counters is not None:
+                counters.nodes_visited += 1
+            istart = currNode.istart
+            edgeSize = currNode.iend - istart + 1
+            cmplen = min(m - i, edgeSize) # comparison length
+            for k in range(1, cmplen): # the first char is the one the child was found by
+                if codes[istart+k] != encoded[i+k]:
+                    return None
+            i += cmplen
+            if path is not None and cmplen == edgeSize:
+                path.append((i, currNode))
+        return currNode
+
+    def _wordSymbols(self, wordID):
+        start = self.codeStarts[wordID]
+        return self.codes, start, self.codeStarts[wordID+1] - start
+
+    def _edgeSymbol(self, node, k):
+        return self.codes[node.istart + k]
+
+    def createLeaf(self, wordID, sourceNode, istart, suffixIndex, firstCode, lastIndex):
+        """
+        @param istart: position of the first char of the edge in codes
+        @param lastIndex: position of the terminating char of the word in codes
+        """
+        leaf = EncodedNode(istart, lastIndex, wordID, suffixIndex)
+        sourceNode.setChild(firstCode, leaf)
+        return leaf
+
+    def splitEdge(self, currNode, parentNode, conflictIndex, goodCount, suffixIndex, wordID, codes):
+        """
+        @param conflictIndex: position in codes of the last char of the current suffix extension
+        """
+        internalNode = EncodedNode(currNode.istart, currNode.istart + goodCount - 1)
+        self.createLeaf(wordID, internalNode, conflictIndex, suffixIndex, codes[conflictIndex], self.codeStarts[wordID+1] - 1)
+        parentNode.setChild(codes[currNode.istart], internalNode)
+        currNode.istart += goodCount
+        internalNode.setChild(codes[currNode.istart], currNode)
+        return internalNode
+
+    def walkDown(self, startNode, iend, skipCount, codes):
+        """
+        @param iend: position in codes of the char introduced in the current phase
+        """
+        istart = iend - skipCount
+        remainingSkip = skipCount
+        currNode = startNode
+        parentNode = None
+        while remainingSkip > 0:
+            childNode = currNode.children[codes[istart]]
+            childLength = childNode.iend - childNode.istart + 1
+            parentNode = currNode
+            currNode = childNode
+            if remainingSkip < childLength:
+                break
+            istart += childLength
+            remainingSkip -= childLength
+        return currNode, parentNode, remainingSkip
+
+    def _addAll(self, wordIDs, progress=None):
+        self._encodeWords()
+        super()._addAll(wordIDs, progress)
@@ -1,10 +1,16 @@
 import colorama
+import sys
 from colorama import init
 init()
-from colorama import Fore, Back, Style
+from colorama import Fore, Back, Style, Cursor
+from colorama.ansi import clear_screen
 # exclusive end
 def printHighlight(word, hStart, hEnd, hColor=Back.YELLOW):
     # hColor can also be Back.GREEN
     enableHighlight = Fore.BLACK + hColor
     disableHighlight = Fore.RESET + Back.RESET
-    print(word[:hStart] + enableHighlight + word[hStart:hEnd] + disableHighlight + word[hEnd:])
\ No newline at end of file
+    print(word[:hStart] + enableHighlight + word[hStart:hEnd] + disableHighlight + word[hEnd:])
+def clearScreen():
+    # ANSI codes instead of a shell command, and only on a terminal so that piped output is kept
+    if sys.stdout.isatty():
+        print(clear_screen() + Cursor.POS(1, 1), end="")
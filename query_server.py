@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+class QueryServer:
+    """
+    Local server of a tree, speaking JSON lines over TCP: every line is a request, answered by a line in the same
+    order, so clients can pipeline requests without waiting for the previous answers.
+
+    Requests are {"id": any, "op": "match", "pattern": str, "ret_match_index": bool, "limit": int, "order": str},
+    {"id": any, "op": "count", "pattern": str} and {"id": any, "op": "add", "words": [str]}, where op defaults to
+    match, and they are answered by {"id": id, "result": result} or {"id": id, "error": message}.
+
+    Requests of all connections are gathered into batches, run in worker threads: consecutive matches with no limit
+    or order share their traversals through match_many. Reads do not lock the tree and run while words are added,
+    see GeneralizedSuffixTree._read, while adds are run one at a time by the tree.
+    """
+
+    def __init__(self, tree, host="127.0.0.1", port=8765, max_batch=256, workers=None):
+        """
+        @param port: port to listen to, 0 for any free port, which is then in self.port once started
+        @param max_batch: max number of requests run together
+        @param workers: number of batches run at the same time, default to the number of CPUs
+        """
+        self.tree = tree
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.workers = workers or os.cpu_count() or 1
+        self.server = None
+
+    async def start(self):
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.pending = asyncio.Queue() # (request, future)
+        self.batcher = asyncio.create_task(self._batch())
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            self.batcher.cancel()
+            self.executor.shutdown(wait=False)
+
+    def close(self):
+        self.server.close()
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue() # futures of the responses, in the order of the requests
+        sender = asyncio.create_task(self._send(responses, writer))
+        try:
+            while line := await reader.readline():
+                future = loop.create_future()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                except ValueError as e:
+                    future.set_result({"id": None, "error": f"invalid request: {e}"})
+                else:
+                    self.pending.put_nowait((request, future))
+                responses.put_nowait(future)
+        except ConnectionError:
+            pass
+        finally:
+            responses.put_nowait(None)
+            await sender
+            writer.close()
+
+    async def _send(self, responses, writer):
+        while (future := await responses.get()) is not None:
+            response = await future
+            try:
+                writer.write(json.dumps(response).encode() + b"\n")
+                if responses.empty(): # write pipelined responses at once
+                    await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _batch(self):
+        """
+        Gather the pending requests into batches, each run in a worker thread as soon as one is free
+        """
+        while True:
+            batch = [await self.pending.get()]
+            await self.slots.acquire() # more requests come in while the workers are busy
+            while len(batch) < self.max_batch and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            asyncio.create_task(self._runBatch(batch))
+
+    async def _runBatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            responses = await loop.run_in_executor(self.executor, self.run, [request for request, _ in batch])
+        except Exception as e:
+            responses = [{"id": request.get("id"), "error": f"{type(e).__name__}: {e}"} for request, _ in batch]
+        finally:
+            self.slots.release()
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    def run(self, requests):
+        """
+        Run a batch of requests in order, matching consecutive plain matches together
+        @return: list of the responses
+        """
+        responses = [None] * len(requests)
+        group = [] # indexes of consecutive matches with no limit or order
+
+        def flush():
+            for ret_match_index in (False, True):
+                indexes = [i for i in group if bool(requests[i].get("ret_match_index")) == ret_match_index]
+                if indexes:
+                    patterns = [requests[i]["pattern"] for i in indexes]
+                    for i, result in zip(indexes, self.tree.match_many(patterns, ret_match_index)):
+                        responses[i] = {"id": requests[i].get("id"), "result": result}
+            group.clear()
+
+        for i, request in enumerate(requests):
+            if request.get("op", "match") == "match" and isinstance(request.get("pattern"), str) \
+                    and request.get("limit") is None and request.get("order") is None:
+                group.append(i)
+                continue
+            flush()
+            try:
+                responses[i] = {"id": request.get("id"), "result": self._execute(request)}
+            except Exception as e:
+                responses[i] = {"id": request.get("id"), "error": f"{type(e).__name__}: {e}"}
+        flush()
+        return responses
+
+    def _execute(self, request):
+        op = request.get("op", "match")
+        if op == "add":
+            words = request.get("words")
+            if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+                raise ValueError("words must be a list of str")
+            self.tree.add_many(words, progress_bar=False)
+            return len(words)
+        pattern = request.get("pattern")
+        if not isinstance(pattern, str):
+            raise ValueError("pattern must be a str")
+        if op == "match":
+            return self.tree.match(pattern, bool(request.get("ret_match_index")), request.get("limit"), request.get("order"))
+        if op == "count":
+            return self.tree.count(pattern)
+        raise ValueError(f"unknown op {op!r}")
+
+def serve(tree, host="127.0.0.1", port=8765, max_batch=256, workers=None):
+    """
+    Serve the tree until interrupted, see QueryServer
+    """
+    server = QueryServer(tree, host, port, max_batch, workers)
+    async def main():
+        await server.start()
+        print(f"Serving on {server.host}:{server.port}")
+        await server.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
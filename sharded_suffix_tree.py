@@ -0,0 +1,181 @@
+from compact_suffix_tree import CompactGeneralizedSuffixTree
+from suffix_tree import MatchView, rankWords
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
+import os
+import threading
+
+def _buildShard(args):
+    wordList, kwargs = args
+    return CompactGeneralizedSuffixTree(wordList, progress_bar=False, **kwargs)
+
+def build_parallel(wordList, workers=None, shards=None, **kwargs):
+    """
+    Build a ShardedGeneralizedSuffixTree, with the shards built by a pool of processes
+    @param workers: number of processes, default to the number of CPUs
+    @param shards: number of shards the word list is split into, default to workers
+    @param kwargs: passed to CompactGeneralizedSuffixTree
+    """
+    workers = workers or os.cpu_count()
+    shards = shards or workers
+    wordList = list(wordList)
+    size = -(-len(wordList) // shards) or 1 # ceil division
+    jobs = [(wordList[start:start+size], kwargs) for start in range(0, len(wordList), size)] or [([], kwargs)]
+
+    if workers == 1:
+        return ShardedGeneralizedSuffixTree(list(map(_buildShard, jobs)))
+    with ProcessPoolExecutor(workers) as pool:
+        return ShardedGeneralizedSuffixTree(list(pool.map(_buildShard, jobs)))
+
+class ShardedGeneralizedSuffixTree:
+    """
+    Generalized Suffix Tree made of trees over consecutive slices of a word list, which can be built in parallel.
+    Queries go to every shard and the results are merged, so it answers as a single tree over the whole list would.
+
+    Not supported, as they need all the words in one tree: scan, annotate, longest_common_substring,
+    common_substrings and save.
+    """
+
+    # sort key of a word for each order of match, same as GeneralizedSuffixTree._wordKey
+    wordKeys = {"length": lambda word:(len(word), word), "lex": lambda word:word}
+
+    def __init__(self, shards):
+        self.shards = shards
+        self._ranks = {} # order -> (number of words, wordIDs in that order, rank of every wordID), see _wordRanks
+
+    @property
+    def termChar(self):
+        return self.shards[0].termChar
+
+    def normalize(self, pattern):
+        """
+        Same as GeneralizedSuffixTree.normalize
+        """
+        return self.shards[0].normalize(pattern)
+
+    def match(self, pattern, ret_match_index=False, limit=None, order=None, lazy=False):
+        """
+        Same as GeneralizedSuffixTree.match
+        """
+        if lazy:
+            return self._lazyMatch(pattern, ret_match_index, limit, order)
+        results = (shard.match(pattern, ret_match_index, limit, order) for shard in self.shards)
+        if order is not None:
+            wordKey = self.wordKeys[order]
+            key = (lambda x:wordKey(x[0])) if ret_match_index else wordKey
+            results = [heapq.merge(*results, key=key)]
+        return list(itertools.islice(itertools.chain.from_iterable(results), limit))
+
+    def _offsets(self):
+        """
+        @return: wordID of the first word of every shard, the wordIDs of the whole tree following the shards in order
+        """
+        return list(itertools.accumulate((len(shard.wordList) for shard in self.shards[:-1]), initial=0))
+
+    def _lazyMatch(self, pattern, ret_match_index, limit, order):
+        wordIDs, indexes = array('i'), array('i')
+        for offset, shard in zip(self._offsets(), self.shards):
+            view = shard.match(pattern, limit=limit, order=order, lazy=True)
+            wordIDs.extend(wordID + offset for wordID in view.wordIDs)
+            indexes.extend(view.indexes)
+        view = MatchView(self, wordIDs, indexes, ret_match_index)
+        return view[:limit] if order is None else view.sorted(order, limit)
+
+    def _id2word(self):
+        offsets = self._offsets()
+        id2words = [shard._id2word() for shard in self.shards]
+        def id2word(wordID):
+            shardID = bisect_right(offsets, wordID) - 1
+            return id2words[shardID](wordID - offsets[shardID])
+        return id2word
+
+    def _wordRanks(self, order):
+        """
+        Same as GeneralizedSuffixTree._wordRanks, over the words of every shard
+        """
+        count = sum(len(shard.wordList) for shard in self.shards)
+        cached = self._ranks.get(order)
+        if cached is not None and cached[0] == count:
+            return cached[2]
+        offsets, wordKey = self._offsets(), self.wordKeys[order]
+        def key(wordID): # NOTE: words from wordList, as the cache of _id2word lags behind it while words are added
+            shardID = bisect_right(offsets, wordID) - 1
+            return wordKey(self.shards[shardID].wordList[wordID - offsets[shardID]][:-1])
+        self._ranks[order] = cached = rankWords(cached, count, key)
+        return cached[2]
+
+    def match_many(self, patterns, ret_match_index=False, as_generator=False):
+        """
+        Same as GeneralizedSuffixTree.match_many
+        """
+        patterns = list(patterns)
+        shardResults = [shard.match_many(patterns, ret_match_index, as_generator=True) for shard in self.shards]
+        results = map(lambda matches:list(itertools.chain.from_iterable(matches)), zip(*shardResults))
+        return results if as_generator else list(results)
+
+    def match_fuzzy(self, pattern, max_edits=1, limit=None, wildcard="?"):
+        """
+        Same as GeneralizedSuffixTree.match_fuzzy
+        """
+        results = (shard.match_fuzzy(pattern, max_edits, limit, wildcard) for shard in self.shards)
+        return list(itertools.islice(heapq.merge(*results, key=lambda x:x[2]), limit))
+
+    def count(self, pattern):
+        return sum(shard.count(pattern) for shard in self.shards)
+
+    def enable_cache(self, max_entries=1024, max_results=None):
+        for shard in self.shards:
+            shard.enable_cache(max_entries, max_results)
+
+    def enable_stats(self):
+        for shard in self.shards:
+            shard.enable_stats()
+
+    def add_hook(self, callback, events=None):
+        for shard in self.shards:
+            shard.add_hook(callback, events)
+
+    def stats(self):
+        """
+        Sum of the stats of the shards
+        """
+        total = {}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def finalize(self, order=None):
+        for shard in self.shards:
+            shard.finalize(order)
+
+    def remove(self, word):
+        """
+        Same as GeneralizedSuffixTree.remove
+        """
+        return sum(shard.remove(word) for shard in self.shards)
+
+    @property
+    def garbage_ratio(self):
+        inTree = sum(len(shard.wordList) - len(shard.removed) + len(shard.garbage) for shard in self.shards)
+        return sum(len(shard.garbage) for shard in self.shards) / inTree if inTree else 0.0
+
+    def compact(self, background=False):
+        """
+        Same as GeneralizedSuffixTree.compact, one shard after the other
+        """
+        if background:
+            thread = threading.Thread(target=self.compact, daemon=True)
+            thread.start()
+            return thread
+        for shard in self.shards:
+            shard.compact()
+
+    def add(self, word):
+        self.shards[-1].add(word)
+
+    def add_many(self, words, progress_bar=False):
+        self.shards[-1].add_many(words, progress_bar)
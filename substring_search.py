@@ -1,57 +1,130 @@
-import os
 import argparse
 from suffix_tree import *
-from highlighter import printHighlight
+from compact_suffix_tree import CompactGeneralizedSuffixTree
+from sharded_suffix_tree import build_parallel
+from suffix_array import GeneralizedSuffixArray
+from encoded_suffix_tree import EncodedGeneralizedSuffixTree
+from highlighter import printHighlight, clearScreen
+from query_server import serve
 
-def test(wordList, gst):
+def test(wordList, gst, sample=None):
+    """
+    Compare the matches of every substring of the words against a naive scan of the word list
+    @param sample: only test the substrings of this many random words
+    @return: list of substrings with wrong matches
+    """
     import random
     print("Testing...")
     randomized = list(wordList)
     random.shuffle(randomized)
-    for word in tqdm(randomized):
+    wrong = []
+    normalized = [gst.normalize(x) for x in wordList] # converted like the words in the tree, e.g. to lower case
+    for word in tqdm(randomized[:sample]):
         n = len(word)
         for start in range(n):
             for end in range(start,n):
                 substring = word[start:end+1]
-                naive = [x for x in wordList if substring in x]
+                naive = [x for x in normalized if gst.normalize(substring) in x]
                 gstac = gst.match(substring)
                 if len(naive) != len(gstac):
                     print("Wrong:", substring)
+                    wrong.append(substring)
+    return wrong
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Preprocess word list to a generalized suffix tree for efficient substring querying.')
-    parser.add_argument("path", type=str, help="Path to the file containing line separated word list.")
+    parser.add_argument("path", type=str, help="Path to the file containing line separated word list, or to an index file when --index is given.")
+    parser.add_argument("-idx", "--index", action='store_true', help="Load a prebuilt index file written by --save-index instead of building from a word list.")
+    parser.add_argument("-si", "--save-index", type=str, default=None, help="Build a compact tree and save it to this index file for later use with --index.")
     parser.add_argument("-cs", "--case-sensitive", action='store_true', help="Enable case sensitive searching.")
-    parser.add_argument("-pp", "--print-progress", action='store_true', help="Print generalized suffix tree parsing process.")
+    parser.add_argument("-pp", "--print-progress", action='store_true', help="Print the progress of the build every second.")
+    parser.add_argument("-st", "--stats", action='store_true', help="Count the work done by the build and the queries, and print the stats of the tree once built.")
     parser.add_argument("-pre", "--preprocess", action='store_true', help="Scan through the input to get the alphabet and to auto select a terminating char that is 1 higher than the max alphabet used in the word list.")
     parser.add_argument("-al", "--alphabet-lookup", action='store_true', help="Preprocess the input and use alphabet lookup table.")
     parser.add_argument("-max", "--max-alphabet", type=int, default=None, help="Max value of char, dafault to 255. Overriden when preprocessing or alphabet lookup is enabled.")
+    parser.add_argument("-c", "--compact", action='store_true', help="Store the tree in compact arrays to save memory, at the cost of slower building.")
+    parser.add_argument("-sa", "--suffix-array", action='store_true', help="Use a suffix array instead of a tree, which takes the least memory.")
+    parser.add_argument("-e", "--encoded", action='store_true', help="Convert the words to integer codes once, for faster building and queries.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Build compact tree shards in parallel with this many processes. Cannot be used with --scan or --save-index.")
+    parser.add_argument("-t", "--test", action='store_true', help="Check the matches of every substring of the word list against a naive scan, then exit.")
+    parser.add_argument("-f", "--finalize", action='store_true', help="Lay out the leaves of the tree after building, for faster queries at the cost of more memory.")
     parser.add_argument("-s", "--sort", action='store_true', help="Sort query results alphabetically.")
+    parser.add_argument("-l", "--limit", type=int, default=None, help="Max number of query results to print.")
+    parser.add_argument("-fz", "--fuzzy", type=int, default=None, metavar="K", help="Also match the words within K typos of the query, where ? stands for any char. Results are ordered by typos.")
+    parser.add_argument("-sc", "--scan", type=str, default=None, metavar="TEXT", help="Print the offset of every occurrence of the words in this text file, then exit.")
+    parser.add_argument("-sv", "--serve", type=int, default=None, metavar="PORT", help="Serve queries as JSON lines on this localhost port instead of reading them from the console.")
+    parser.add_argument("-ca", "--cache", type=int, default=None, help="Cache the results of this many recent queries.")
 
     opt = parser.parse_args()
+    if opt.save_index and (opt.workers or opt.suffix_array or opt.encoded):
+        parser.error("--save-index cannot be used with --workers, --suffix-array or --encoded")
+    if opt.scan and opt.workers:
+        parser.error("--scan cannot be used with --workers")
 
-    wordList = open(opt.path, "rb").readlines()
-    wordList = list(map(lambda x:x.decode("utf-8").rstrip(), wordList))
+    if opt.index:
+        print("Loading index file")
+        gst = CompactGeneralizedSuffixTree.load(opt.path)
+        # a compact tree has no child table to overflow, so no need to check the alphabet of queries
+        opt.alphabet_lookup, opt.max_alphabet = False, None
+        opt.case_sensitive = gst.case_sensitive
+    else:
+        # default values
+        lookup_table = None
+        termChar = chr(256) # it is sufficient to be a char not used anywhere in the input word list
 
-    # default values
-    lookup_table = None
-    termChar = chr(256) # it is sufficient to be a char not used anywhere in the input word list
+        if opt.preprocess or opt.alphabet_lookup:
+            lookup_table, termChar = getAlphabetTable(readWords(opt.path)) # override termChar
+            if not opt.alphabet_lookup:
+                lookup_table = None # disable lookup table if not specified by user
+            print(f"Terminating char value: {ord(termChar)}")
+        elif opt.max_alphabet:
+            opt.max_alphabet += 1 # +1 to include term char
+            termChar = chr(opt.max_alphabet)
 
-    if opt.preprocess or opt.alphabet_lookup:
-        lookup_table, termChar = getAlphabetTable(wordList) # override termChar
-        if not opt.alphabet_lookup:
-            lookup_table = None # disable lookup table if not specified by user
-        print(f"Terminating char value: {ord(termChar)}")
-    elif opt.max_alphabet:
-        opt.max_alphabet += 1 # +1 to include term char
-        termChar = chr(opt.max_alphabet)
+        print("Initializing Generalized Suffix Tree")
+        if opt.workers:
+            gst = build_parallel(readWords(opt.path), opt.workers, termChar=termChar, case_sensitive=opt.case_sensitive, collect_stats=opt.stats)
+        else:
+            if opt.suffix_array:
+                treeClass = GeneralizedSuffixArray
+            elif opt.encoded:
+                treeClass = EncodedGeneralizedSuffixTree
+            elif opt.compact or opt.save_index:
+                treeClass = CompactGeneralizedSuffixTree
+            else:
+                treeClass = GeneralizedSuffixTree
+            gst = treeClass.from_file(opt.path, termChar=termChar, alphabetMax=opt.max_alphabet, alphabetLookup=lookup_table, case_sensitive=opt.case_sensitive,print_progress=opt.print_progress, collect_stats=opt.stats)
+
+        if opt.finalize:
+            print("Finalizing Generalized Suffix Tree")
+            gst.finalize()
+
+        if opt.save_index:
+            gst.save(opt.save_index)
+            print(f"Index saved to {opt.save_index}")
+
+        if opt.test:
+            test(list(readWords(opt.path)), gst)
+            exit()
 
-    print("Initializing Generalized Suffix Tree")
-    gst = GeneralizedSuffixTree(wordList, termChar=termChar, alphabetMax=opt.max_alphabet, alphabetLookup=lookup_table, case_sensitive=opt.case_sensitive,print_progress=opt.print_progress)
+    if opt.cache:
+        gst.enable_cache(opt.cache)
 
-    # test(wordList, gst)
-    # exit()
+    if opt.stats:
+        gst.enable_stats() # already counting unless loaded from an index
+        for key, value in gst.stats().items():
+            print(f"{key}: {value}")
+
+    if opt.scan is not None:
+        id2word = gst._id2word()
+        for offset, wordID in gst.scan(readChunks(opt.scan)):
+            print(offset, id2word(wordID), sep="\t")
+        exit()
+
+    if opt.serve is not None:
+        serve(gst, port=opt.serve)
+        exit()
 
     # to check if alphabet in query is also in wordList; or within the specified max alphabet
     check_alphabet = lambda query: all(map(lambda x:ord(x) in lookup_table,     query))
@@ -61,18 +134,20 @@ if __name__ == "__main__":
         query = input("Enter search query: ")
         if not opt.case_sensitive:
             query = query.lower()
-        os.system('cls')
+        clearScreen()
         print("Query:", query)
 
-        if opt.alphabet_lookup and not check_alphabet(query) or opt.max_alphabet and not check_max(query):
-            match = []
+        if opt.fuzzy is not None: # chars out of the alphabet are typos
+            match = [(word, start) for word, start, _ in gst.match_fuzzy(query, opt.fuzzy, opt.limit)]
+            total = len(match)
+        elif opt.alphabet_lookup and not check_alphabet(query) or opt.max_alphabet and not check_max(query):
+            match, total = [], 0
         else:
-            match = gst.match(query, ret_match_index=True) # defaultdict mode
-
-        if opt.sort:
-            match.sort()
+            # a view, so only the words printed are decoded, and sorted by their precomputed ranks
+            match = gst.match(query, ret_match_index=True, limit=opt.limit, order="lex" if opt.sort else None, lazy=True)
+            total = gst.count(query) if opt.limit is not None else len(match)
 
         for word,start in match:
             end = start + len(query)
             printHighlight(word, start, end)
-        print("\nTotal", len(match))
+        print("\nTotal", total)
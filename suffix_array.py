@@ -0,0 +1,355 @@
+from suffix_tree import GeneralizedSuffixTree, WordBuffer, ProgressReporter, caseFreeChar
+from array import array
+from bisect import bisect_left, bisect_right, insort
+import itertools
+import time
+from tqdm import tqdm
+
+class GeneralizedSuffixArray(GeneralizedSuffixTree):
+    """
+    Low memory alternative to the Generalized Suffix Tree with the same interface, made of the sorted suffixes of
+    the words concatenated with their terminating char, along with the LCP array and the word of every position.
+
+    A "node" is the range [lo, hi) of sorted suffixes starting with a pattern, found by binary search,
+    so a match is a slice as with a finalized tree, and finalize has nothing to do.
+    """
+
+    def __init__(self, wordList, termChar="$", case_sensitive=False, print_progress=False, progress_bar=True, compact_threshold=None, collect_stats=False, **kwargs):
+        """
+        @param kwargs: other arguments of GeneralizedSuffixTree, which have no effect as there is no node
+        """
+        self.alphabetMax = None
+        self.alphabetLookup = None
+        self.case_sensitive = case_sensitive
+        self.termChar = termChar if case_sensitive else caseFreeChar(termChar)
+        self.layout = None
+        self._initState(compact_threshold, collect_stats)
+        if print_progress:
+            self.add_hook(ProgressReporter(), ProgressReporter.events)
+
+        self.wordList = WordBuffer() # preprocessed word list
+        self.sa = array('i') # built by _addAll
+        self.resort = True # whether _addAll must sort all suffixes again
+        self.add_many(wordList, progress_bar)
+
+    addInChunks = False # a chunk would sort all suffixes again
+
+    @property
+    def root(self):
+        return (0, len(self.sa))
+
+    def _build(self, progress_bar=True):
+        """
+        Sort the suffixes by prefix doubling: after the round with length k, suffixes are ranked by their first 2k
+        chars, where the chars past the terminating char of a word rank lower than any char,
+        so that the order is the same as comparing the suffixes of the words as str.
+        The rank of a suffix is 1 + the index in sa of the first suffix tied with it, so each round only sorts the
+        groups of suffixes still tied, in place, and the other suffixes keep their rank.
+        The suffixes of removed words are left out, as compact() would drop them.
+        """
+        wordList = self.wordList
+        starts = array('q', [0]) # start of every word in the concatenation, with the total length appended
+        wordOf = array('i') # wordID of every position
+        for wordID, word in enumerate(wordList):
+            starts.append(starts[-1] + len(word))
+            wordOf.extend(array('i', [wordID]) * len(word))
+
+        # NOTE: arrays rather than lists of ints, which take 9 times more memory, and no array of the end of the
+        # word of every position, as it is starts[wordOf[p]+1]
+        n = starts[-1]
+        removed = set(self.removed)
+        code = {c: i for i, c in enumerate(sorted(set(itertools.chain.from_iterable(wordList))))}
+        rank = array('i', [0]) * n # code of the char until sorted by it, then rank, where 0 is beyond the end of the word
+        bucketStart = array('i', [0]) * (len(code) + 1)
+        for wordID, word in enumerate(wordList):
+            if wordID not in removed:
+                for p, c in enumerate(map(code.__getitem__, word), starts[wordID]):
+                    rank[p] = c
+                    bucketStart[c+1] += 1
+        bucketStart = array('i', itertools.accumulate(bucketStart))
+        # lo, hi of every range [lo, hi) of sa whose suffixes are still tied
+        groups = array('i', (x for lo, hi in zip(bucketStart, bucketStart[1:]) if hi - lo > 1 for x in (lo, hi)))
+
+        # counting sort by first char
+        sa = array('i', [0]) * bucketStart[-1]
+        fill = array('i', bucketStart)
+        for wordID in range(len(wordList)):
+            if wordID not in removed:
+                for p in range(starts[wordID], starts[wordID+1]):
+                    c = rank[p]
+                    sa[fill[c]] = p
+                    fill[c] += 1
+                    rank[p] = bucketStart[c] + 1
+        newRank = array('i', rank)
+
+        maxLength = max(map(len, wordList), default=0)
+        k = 1
+        with tqdm(total=max(maxLength-1, 0).bit_length(), disable=not progress_bar) as progress:
+            while groups and k < maxLength:
+                key = lambda p: rank[p+k] if p+k < starts[wordOf[p]+1] else 0
+                newGroups = array('i')
+                for g in range(0, len(groups), 2):
+                    lo, hi = groups[g], groups[g+1]
+                    first, prevKey = lo, None # index in sa of the first suffix tied with the current one
+                    for i, (pKey, p) in enumerate(sorted((key(p), p) for p in sa[lo:hi]), lo):
+                        if pKey != prevKey:
+                            if i - first > 1:
+                                newGroups.extend((first, i))
+                            first, prevKey = i, pKey
+                        sa[i] = p
+                        newRank[p] = first + 1
+                    if hi - first > 1:
+                        newGroups.extend((first, hi))
+                rank[:] = newRank
+                groups = newGroups
+                k *= 2
+                progress.update()
+
+        with self._writing(): # readers keep using the previous arrays while sorting
+            self._cacheWords(len(starts) - 1)
+            self.starts, self.wordOf, self.sa, self._lcp = starts, wordOf, sa, None
+            self.garbage -= removed
+        self.resort = False
+
+    @property
+    def lcp(self):
+        """
+        Length of the longest common prefix of each suffix in sa with the previous one, computed with Kasai's
+        algorithm on first access since add() discards it
+        """
+        if self._lcp is None:
+            sa, starts, wordOf, wordList = self.sa, self.starts, self.wordOf, self.wordList
+            n = len(sa)
+            saIndex = array('i', [0]) * n
+            for i, p in enumerate(sa):
+                saIndex[p] = i
+            lcp = array('i', [0]) * n
+            for wordID, word in enumerate(wordList):
+                h = 0
+                for s in range(len(word)):
+                    i = saIndex[starts[wordID] + s]
+                    if i == 0:
+                        h = 0
+                        continue
+                    q = sa[i-1]
+                    other = wordList[wordOf[q]]
+                    t = q - starts[wordOf[q]]
+                    while s+h < len(word) and t+h < len(other) and word[s+h] == other[t+h] and word[s+h] != self.termChar:
+                        h += 1
+                    lcp[i] = h
+                    if h > 0:
+                        h -= 1
+            self._lcp = lcp
+        return self._lcp
+
+    def _suffix(self, p):
+        wordID = self.wordOf[p]
+        return self.wordList[wordID][p - self.starts[wordID]:]
+
+    ## node protocol
+
+    def _nodeChildren(self, node):
+        return ()
+
+    def _nodeOrigins(self, node):
+        lo, hi = node
+        sa, starts, wordOf = self.sa, self.starts, self.wordOf
+        for p in sa[lo:hi]:
+            wordID = wordOf[p]
+            yield wordID, p - starts[wordID]
+
+    def _edges(self, node, depth, firstSymbols=None):
+        """
+        The suffixes of the range sharing their next char, one char at a time, as in a tree of single char edges
+        """
+        lo, hi = node
+        sa, starts, wordOf, wordList = self.sa, self.starts, self.wordOf, self.wordList
+        charAt = lambda p: wordList[wordOf[p]][p - starts[wordOf[p]] + depth]
+        if firstSymbols is not None:
+            for c in sorted(firstSymbols):
+                start = bisect_left(sa, c, lo, hi, key=charAt)
+                end = bisect_right(sa, c, start, hi, key=charAt)
+                if start < end:
+                    yield (start, end), c
+            return
+        while lo < hi:
+            c = charAt(sa[lo])
+            end = bisect_right(sa, c, lo, hi, key=charAt)
+            if c != self.termChar:
+                yield (lo, end), c
+            lo = end
+
+    ## tree functions
+
+    def finalize(self, order=None):
+        """
+        Nothing to do, matches are already slices of the suffix array
+        """
+
+    def _locate(self, pattern, path=None):
+        lo, hi = path[-1][1] if path else self.root
+        m = len(pattern)
+        key = lambda p: self._suffix(p)[:m]
+        lo = bisect_left(self.sa, pattern, lo, hi, key=key)
+        hi = bisect_right(self.sa, pattern, lo, hi, key=key)
+        if lo == hi:
+            return None
+        if path is not None:
+            path.append((m, (lo, hi)))
+        return (lo, hi)
+
+    def scan(self, chunks):
+        """
+        Same as GeneralizedSuffixTree.scan, without suffix links: from every offset, the prefixes of the text are
+        searched one char longer at a time, each within the range of the previous one, so the words found at an
+        offset come shortest first
+        """
+        if isinstance(chunks, str):
+            chunks = (chunks,)
+        return self._scan(iter(chunks), self._version)
+
+    def _scan(self, chunks, version):
+        termChar, removed = self.termChar, self.removed
+        maxLength = max(map(len, self.wordList), default=1) - 1 # without the terminating char
+        text, start = "", 0 # text from offset start
+        for chunk in itertools.chain(chunks, (None,)):
+            if self._version != version:
+                raise RuntimeError("Tree modified during scan")
+            if chunk is not None:
+                text += self.normalize(chunk)
+            end = len(text) if chunk is None else len(text) - maxLength # offsets whose longest match is in text
+            for k in range(max(end, 0)):
+                path = [(0, self.root)]
+                for m in range(1, min(maxLength, len(text) - k) + 1):
+                    prefix = text[k:k+m]
+                    if prefix[-1] == termChar or self._locate(prefix, path) is None:
+                        break
+                    node = self._locate(prefix + termChar, path[-1:])
+                    if node is not None:
+                        for wordID, suffixIndex in self._nodeOrigins(node):
+                            if suffixIndex == 0 and wordID not in removed:
+                                yield start + k, wordID
+            text, start = text[max(end, 0):], start + max(end, 0)
+
+    def _annotate(self, wordIDs=None):
+        """
+        Same as GeneralizedSuffixTree._annotate, where the internal nodes are the lcp-intervals, the ranges of
+        suffixes sharing a prefix longer than the ones around them, enumerated bottom-up with a stack as the lcp
+        array goes down, and a leaf is a suffix
+        """
+        removed = self.removed
+        selected = (lambda wordID: wordID not in removed) if wordIDs is None else wordIDs.__contains__
+        sa, lcp, starts, wordOf = self.sa, self.lcp, self.starts, self.wordOf
+        n = len(sa)
+        last = {} # wordID -> index in sa of its last suffix
+        stack = [[0, 0, 0, -1, 0, 0]] # [lcp, count, duplicates, wordID, suffixIndex, max count of a child] of the open intervals
+        lbs = [0] # start of each open interval
+        def addChild(interval, child):
+            count, wordID, suffixIndex, extends = child
+            if count:
+                interval[1] += count
+                if interval[3] < 0:
+                    interval[3], interval[4] = wordID, suffixIndex
+                if extends and count > interval[5]:
+                    interval[5] = count
+
+        done = (0, -1, 0, False) # (count, wordID, suffixIndex, whether it extends its parent) of the interval or leaf just before the boundary
+        for i in range(n + 1):
+            if i > 0:
+                l = lcp[i] if i < n else 0
+                lb = i - 1
+                while l < stack[-1][0]:
+                    top = stack.pop()
+                    lb = lbs.pop()
+                    addChild(top, done)
+                    count = top[1] - top[2]
+                    if count > top[5]:
+                        yield top[0], count, top[3], top[4]
+                    done = (count, top[3], top[4], True)
+                if l > stack[-1][0]:
+                    stack.append([l, 0, 0, -1, 0, 0])
+                    lbs.append(lb)
+                addChild(stack[-1], done)
+            if i < n:
+                p = sa[i]
+                wordID = wordOf[p]
+                if selected(wordID):
+                    suffixIndex = p - starts[wordID]
+                    if wordID in last:
+                        stack[bisect_right(lbs, last[wordID]) - 1][2] += 1
+                    last[wordID] = i
+                    depth = starts[wordID+1] - p - 1 # without the terminating char
+                    extends = depth > max(lcp[i], lcp[i+1] if i+1 < n else 0)
+                    if extends:
+                        yield depth, 1, wordID, suffixIndex
+                    done = (1, wordID, suffixIndex, extends)
+                else:
+                    done = (0, -1, 0, False)
+
+
+    def _getMatch(self, startNode, result_accumulator):
+        for wordID, suffixIndex in self._nodeOrigins(startNode):
+            if wordID not in result_accumulator or suffixIndex < result_accumulator[wordID]:
+                result_accumulator[wordID] = suffixIndex
+        if self.counters is not None:
+            self.counters.leaves_scanned += startNode[1] - startNode[0]
+        return result_accumulator
+
+    def stats(self):
+        """
+        @return: dict of the number of suffixes and the bytes of the arrays, along with the counters if enabled
+        """
+        result = {
+            "suffixes": len(self.sa),
+            "sa_bytes": self.sa.itemsize * len(self.sa),
+            "position_bytes": self.wordOf.itemsize * len(self.wordOf) + self.starts.itemsize * len(self.starts),
+        }
+        if self.counters is not None:
+            result.update(self.counters.as_dict())
+        return result
+
+    def compact(self, background=False):
+        """
+        Drop the suffixes of the removed words, which keeps the order of the others so nothing needs sorting.
+        It is fast enough to always be done in the calling thread.
+        """
+        start = time.perf_counter()
+        with self._writeLock:
+            garbage, wordOf = self.garbage, self.wordOf
+            sa = array('i', (p for p in self.sa if wordOf[p] not in garbage))
+            with self._writing():
+                self.sa, self._lcp = sa, None
+            self.garbage = set()
+        if self.hooks:
+            self._emit("compact", words=len(garbage), seconds=time.perf_counter() - start)
+
+    def _renameTermEdges(self, oldTermChar, newTermChar):
+        self.resort = True # the order of suffixes depends on the terminating char, so sort them again in _addAll
+
+    def _addAll(self, wordIDs, progress=None):
+        """
+        Insert the suffixes of the words one by one if they are few, otherwise sort all suffixes again
+        """
+        newChars = sum(len(self.wordList[wordID]) for wordID in wordIDs)
+        if self.counters is not None:
+            self.counters.words += len(wordIDs)
+        if not self.resort and newChars * 16 < len(self.sa):
+            super()._addAll(wordIDs, progress)
+        else:
+            self._build(progress is not None)
+            if progress is not None:
+                progress.update(len(wordIDs))
+            if self.hooks and wordIDs:
+                self._emit("build_progress", wordID=wordIDs[-1], words=len(wordIDs))
+
+    def _add(self, wordID):
+        """
+        Insert the suffixes of the word into the suffix array, which is linear in the size of the array
+        """
+        word = self.wordList[wordID]
+        start = self.starts[-1]
+        self.starts.append(start + len(word))
+        self.wordOf.extend(array('i', [wordID]) * len(word))
+        for p in range(start, start + len(word)):
+            insort(self.sa, p, key=self._suffix)
+        self._lcp = None
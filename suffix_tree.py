@@ -1,7 +1,16 @@
-from highlighter import printHighlight
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from array import array
+from bisect import bisect_right
 from tqdm import tqdm
 import functools
+import heapq
+import itertools
+import os
+import contextlib
+import copy
+import sys
+import threading
+import time
 
 def compose(*functions):
     return functools.reduce(lambda f, g: lambda x: f(g(x)), functions, lambda x: x)
@@ -21,6 +30,7 @@ class SuffixTreeNode:
             self.next = nextSuffixOrigin # implemented as linked list
 
     # used so that list[x] becomes list[lookup_table[x]]
+    # the lookup table is shared by all nodes, and grows when a key not in it is set
     class LookupList:
         def __init__(self, lookup_table):
             self.list = [None] * len(lookup_table)
@@ -28,9 +38,17 @@ class SuffixTreeNode:
         def __len__(self):
             return len(self.list)
         def __getitem__(self, key):
-            return self.list[self.lookup_table[key]]
+            try:
+                return self.list[self.lookup_table[key]]
+            except (KeyError, IndexError): # not in the table, or added to it after this list was allocated
+                return None
         def __setitem__(self, key, new_val):
-            self.list[self.lookup_table[key]] = new_val
+            index = self.lookup_table.get(key)
+            if index is None:
+                index = self.lookup_table[key] = len(self.lookup_table)
+            if index >= len(self.list):
+                self.list.extend([None] * (index + 1 - len(self.list)))
+            self.list[index] = new_val
 
 
     def __init__(self, wordID=None, istart=None, iend=None, isLeaf=False, suffixIndex=None, alphabetMax=255, alphabetLookup=None):
@@ -48,6 +66,8 @@ class SuffixTreeNode:
 
         self._childlist = [] # stores usable index in children for faster iteration
 
+        self.rank = None # position of the node in depth first order, set by GeneralizedSuffixTree.finalize
+
         # Only applicable to leaf node,
         # Which means that suffix is settled,
         #   and will always remain as leaf node
@@ -87,15 +107,35 @@ class SuffixTreeNode:
     def getChild(self, char):
         if self.isLeaf():
             return None
-        else:
+        if type(self.children) is defaultdict: # NOTE: get, as a missing key would be inserted
+            return self.children.get(ord(char))
+        try:
             return self.children[ord(char)]
+        except IndexError: # beyond alphabetMax
+            return None
 
     def setChild(self, char, newChild):
         if not self.isLeaf():
-            if self.children[ord(char)] is None:
+            try:
+                isNewChild = self.children[ord(char)] is None
+            except IndexError:
+                # beyond alphabetMax, so fall back to a dict for this node only
+                self.children = defaultdict(lambda:None, ((i, self.children[i]) for i in self._childlist))
+                isNewChild = True
+            if isNewChild:
                 self._childlist.append(ord(char)) # based on the idea that child will only get added, never deleted
             self.children[ord(char)] = newChild
 
+    def replaceChildChar(self, oldChar, newChar):
+        """
+        Move the child starting with oldChar to newChar, used when the terminating char is replaced
+        """
+        child = self.getChild(oldChar)
+        if child is not None:
+            self.children[ord(oldChar)] = None
+            self._childlist.remove(ord(oldChar))
+            self.setChild(newChar, child)
+
     def getChildren(self):
         return map(lambda x:self.children[x], self._childlist)
         # return filter(lambda x:x is not None, self.children)
@@ -108,28 +148,665 @@ class SuffixTreeNode:
         self.setChild(char, newChild)
     """
 
+class MatchLayout:
+    """
+    Flat arrays built by GeneralizedSuffixTree.finalize, indexed by the rank of a node, so that the result of a match
+    ending on a node is a contiguous slice
+    """
+    names = ("matchWord", "matchIndex", "matchStart", "matchEnd")
+
+    def __init__(self):
+        # for each wordID found below a node, the smallest suffixIndex, grouped by node
+        self.matchWord = array('i')
+        self.matchIndex = array('i')
+        # per node, the range [start, end) of its words in the arrays above
+        self.matchStart = array('i')
+        self.matchEnd = array('i')
+        self.order = None # order of the words of each node, see GeneralizedSuffixTree.finalize
+
+    def matches(self, rank):
+        lo, hi = self.matchStart[rank], self.matchEnd[rank]
+        return zip(self.matchWord[lo:hi], self.matchIndex[lo:hi])
+
+class MatchView:
+    """
+    Lazy result of GeneralizedSuffixTree.match: the wordIDs and match indexes of the matched words in compact arrays,
+    where a word is only decoded when it is accessed. Slicing and sorting return new views without decoding any word,
+    sorting by the rank of every word in that order, which the tree computes once for all queries.
+    """
+
+    def __init__(self, tree, wordIDs, indexes, ret_match_index=False):
+        """
+        @param tree: tree providing _id2word and _wordRanks for the wordIDs
+        @param wordIDs: array of the matched wordIDs
+        @param indexes: array of the smallest match index in each word
+        @param ret_match_index: whether the items are (word, match_index) rather than words
+        """
+        self.tree = tree
+        self.wordIDs = wordIDs
+        self.indexes = indexes
+        self.ret_match_index = ret_match_index
+
+    @classmethod
+    def fromItems(cls, tree, items, ret_match_index=False):
+        """
+        @param items: iterable of (wordID, match index)
+        """
+        items = list(items)
+        return cls(tree, array('i', [wordID for wordID, _ in items]), array('i', [index for _, index in items]), ret_match_index)
+
+    def __len__(self):
+        return len(self.wordIDs)
+
+    def __iter__(self):
+        words = map(self.tree._id2word(), self.wordIDs)
+        return zip(words, self.indexes) if self.ret_match_index else words
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return MatchView(self.tree, self.wordIDs[i], self.indexes[i], self.ret_match_index)
+        word = self.tree._id2word()(self.wordIDs[i])
+        return (word, self.indexes[i]) if self.ret_match_index else word
+
+    def __repr__(self):
+        return f"<MatchView of {len(self)} words>"
+
+    def sorted(self, order="lex", limit=None):
+        """
+        @param order: "length" or "lex", to sort the words from the shortest or alphabetically
+        @param limit: max number of words to keep, the first ones in that order
+        @return: new view of the words in that order
+        """
+        wordIDs = self.wordIDs
+        key = list(map(self.tree._wordRanks(order).__getitem__, wordIDs)).__getitem__
+        positions = range(len(wordIDs))
+        positions = heapq.nsmallest(limit, positions, key) if limit is not None else sorted(positions, key=key)
+        return MatchView(self.tree, array('i', map(wordIDs.__getitem__, positions)),
+                         array('i', map(self.indexes.__getitem__, positions)), self.ret_match_index)
+
+class SubstringCounts:
+    """
+    Flat arrays built by GeneralizedSuffixTree.annotate, with an entry per node in post order: the length of its
+    path, the number of distinct words having its path as a substring, and a suffix starting with its path
+    """
+    names = ("depth", "count", "wordID", "suffixIndex")
+
+    def __init__(self, rows=()):
+        """
+        @param rows: iterable of (depth, count, wordID, suffixIndex)
+        """
+        for name in self.names:
+            setattr(self, name, array('i'))
+        for depth, count, wordID, suffixIndex in rows:
+            self.depth.append(depth)
+            self.count.append(count)
+            self.wordID.append(wordID)
+            self.suffixIndex.append(suffixIndex)
+
+    def __len__(self):
+        return len(self.depth)
+
+class WordBuffer:
+    """
+    Append-only list of words stored as a few long strings, joined every chunkSize words, with the offset of every
+    word in its string, which takes far less memory than a list of str
+    """
+    chunkSize = 4096
+
+    def __init__(self, words=()):
+        self.chunks = [] # joined words of every full chunk
+        self.offsets = array('I') # start of every word of the full chunks in its chunk
+        self.pending = [] # words of the last chunk, joined once it is full
+        self.extend(words)
+
+    def __len__(self):
+        return len(self.chunks) * self.chunkSize + len(self.pending)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        chunkID = i // self.chunkSize
+        k = i - chunkID * self.chunkSize
+        pending, chunks = self.pending, self.chunks # NOTE: in this order, see append
+        if chunkID < len(chunks):
+            chunk = chunks[chunkID]
+            return chunk[self.offsets[i]:self.offsets[i+1] if k+1 < self.chunkSize else len(chunk)]
+        if chunkID == len(chunks) and k < len(pending):
+            return pending[k]
+        raise IndexError("word index out of range")
+
+    def charAt(self, i, k):
+        """
+        @return: self[i][k], without slicing the word out of its chunk
+        """
+        chunkID = i // self.chunkSize
+        pending, chunks = self.pending, self.chunks
+        if chunkID < len(chunks):
+            return chunks[chunkID][self.offsets[i] + k]
+        return pending[i - chunkID * self.chunkSize][k]
+
+    def __iter__(self):
+        for chunkID, chunk in enumerate(self.chunks):
+            offsets = self.offsets[chunkID*self.chunkSize:(chunkID+1)*self.chunkSize]
+            yield from map(chunk.__getitem__, map(slice, offsets, offsets[1:] + array('I', [len(chunk)])))
+        yield from self.pending
+
+    def append(self, word):
+        self.pending.append(word)
+        if len(self.pending) == self.chunkSize:
+            # NOTE: offsets first, then chunks, then pending, so a word is always readable by a reader taking pending
+            # before chunks: from its chunk once joined, from the previous pending list otherwise
+            self.offsets.extend(itertools.accumulate(map(len, self.pending[:-1]), initial=0))
+            self.chunks.append("".join(self.pending))
+            self.pending = []
+
+    def extend(self, words):
+        for word in words:
+            self.append(word)
+
+    def replaceTermChar(self, oldTermChar, newTermChar):
+        """
+        Replace the last char of every word, which is found nowhere else
+        """
+        self.chunks = [chunk.replace(oldTermChar, newTermChar) for chunk in self.chunks]
+        self.pending = [word[:-1] + newTermChar for word in self.pending]
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results, evicting the least recently used ones when there are more than max_entries
+    results, or more than max_results words in all results
+    """
+    def __init__(self, max_entries=1024, max_results=None):
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self.entries = OrderedDict() # key -> tuple of results
+        self.results = 0 # total number of words in all entries
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0 # incremented on clear, so that results computed before are not put
+        self.lock = threading.Lock() # queries run in many threads, see GeneralizedSuffixTree._read
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return result
+
+    def put(self, key, result, generation):
+        """
+        @param generation: value of generation before result was computed
+        """
+        with self.lock:
+            if generation != self.generation or self.max_results is not None and len(result) > self.max_results:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.results -= len(previous)
+            self.entries[key] = result
+            self.results += len(result)
+            while len(self.entries) > self.max_entries or self.max_results is not None and self.results > self.max_results:
+                _, evicted = self.entries.popitem(last=False)
+                self.results -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.results = 0
+            self.generation += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "results": self.results,
+            }
+
+# events hooks can be called on, with the tree and a dict of info about the event
+HOOK_EVENTS = ("build_start", "build_progress", "build_end", "finalize", "compact", "query")
+
+class TreeStats:
+    """
+    Counters of the work done by a tree, only kept once enabled, as the hot loops add to them once per word or query
+    """
+    names = ("words", "extensions", "link_traversals", "walkdown_skips", "split_edges",
+             "queries", "nodes_visited", "leaves_scanned")
+
+    def __init__(self):
+        for name in self.names:
+            setattr(self, name, 0)
+
+    def add(self, **counts):
+        for name, count in counts.items():
+            setattr(self, name, getattr(self, name) + count)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.names}
+
+class ProgressReporter:
+    """
+    Build hook printing how many words were added at most every interval seconds,
+    which costs next to nothing unlike printing every extension
+    """
+    events = ("build_start", "build_progress", "build_end")
+
+    def __init__(self, interval=1.0, file=None):
+        """
+        @param file: where to print, default to stderr
+        """
+        self.interval = interval
+        self.file = file
+        self.start = self.last = 0.0
+        self.words = 0
+        self.total = None
+
+    def __call__(self, event, tree, info):
+        now = time.perf_counter()
+        if event == "build_start":
+            self.start = self.last = now
+            self.words = 0
+            self.total = info["total"]
+        elif event == "build_progress":
+            self.words += info["words"]
+            if now - self.last >= self.interval:
+                self.last = now
+                self.report(now)
+        elif event == "build_end":
+            self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.start
+        total = f"/{self.total}" if self.total is not None else ""
+        rate = self.words / elapsed if elapsed else 0.0
+        print(f"{self.words}{total} words added in {elapsed:.1f}s, {rate:.0f} words/s", file=self.file or sys.stderr)
+
 class GeneralizedSuffixTree:
+    """
+    Thread safety: any number of threads can query the tree while one thread at a time adds, removes, compacts or
+    finalizes. Queries never lock, and are run again if the tree was modified meanwhile, see _read.
+    """
 
-    def __init__(self, wordList, termChar="$", alphabetMax=None, alphabetLookup=None, case_sensitive=False, print_progress=False):
-        self.print_progress = print_progress
+    def __init__(self, wordList, termChar="$", alphabetMax=None, alphabetLookup=None, case_sensitive=False, print_progress=False, progress_bar=True, compact_threshold=None, collect_stats=False):
+        """
+        @param print_progress: print the progress of the build periodically, with a ProgressReporter hook
+        @param compact_threshold: garbage ratio from which removing a word starts compact() in the background
+        @param collect_stats: whether to count the work done from the start, see enable_stats
+        """
         self.alphabetMax = alphabetMax
         self.alphabetLookup = alphabetLookup
+        self.case_sensitive = case_sensitive
+        self.termChar = termChar if case_sensitive else caseFreeChar(termChar) # as stored at the end of every word
+
+        self.wordList = WordBuffer() # preprocessed word list
+        self.layout = None # MatchLayout, only available after finalize
+        self._initState(compact_threshold, collect_stats)
+        if print_progress:
+            self.add_hook(ProgressReporter(), ProgressReporter.events)
+        self._initStorage()
+        self.add_many(wordList, progress_bar)
+
+    def _initState(self, compact_threshold=None, collect_stats=False):
+        """
+        Initialize what is not built from the words: removal, locking, caching and instrumentation
+        """
+        self.counters = TreeStats() if collect_stats else None
+        self.hooks = [] # (callback, events or None for all)
+        self.cache = None # QueryCache, only available after enable_cache
+        self._words = None # words without the terminating char, cached along with the queries
+        self.removed = set() # wordIDs tombstoned by remove, never reused
+        self.garbage = set() # removed wordIDs whose suffixes are still in the tree
+        self.compact_threshold = compact_threshold
+        self._writeLock = threading.Lock() # held by a writer for the whole modification, so there is one at a time
+        self._seqLock = threading.Lock() # held by the writer while the tree is inconsistent, see _read
+        self._version = 0 # odd while the tree is inconsistent
+        self._compaction = None # background compaction thread
+        self._scanIndex = None # (version, *_wordAncestors()) of the last scan
+        self._substringCounts = None # ((version, number of removed words), SubstringCounts) built by annotate
+        self._ranks = {} # order -> (number of words, wordIDs in that order, rank of every wordID), see _wordRanks
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_writeLock"], state["_seqLock"], state["_compaction"]
+        state["_scanIndex"] = state["_substringCounts"] = None
+        state["_ranks"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._writeLock = threading.Lock()
+        self._seqLock = threading.Lock()
+        self._compaction = None
+
+    ## concurrency
+
+    # number of times a query is run again because of concurrent writes, before blocking them instead
+    readRetries = 8
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        Section where the tree is modified in place, during which readers wait and after which they retry
+        """
+        with self._seqLock:
+            self._version += 1
+            try:
+                yield
+            finally:
+                self._version += 1
+
+    def _read(self, query, *args):
+        """
+        Run a query without locking, like a seqlock reader: readers never wait for each other, and the query is only
+        run again if a write section overlapped with it, in which case its result, or any error, is discarded.
+        Writers do the slow part of their work outside of write sections, so readers only wait for short ones.
+        """
+        for _ in range(self.readRetries):
+            version = self._version
+            if version & 1: # in a write section, wait for it to end
+                with self._seqLock:
+                    pass
+                continue
+            try:
+                result = query(*args)
+            except Exception:
+                if self._version == version:
+                    raise
+                continue
+            if self._version == version:
+                return result
+        with self._seqLock: # writes keep interleaving, so block them for once
+            return query(*args)
+
+    def enable_cache(self, max_entries=1024, max_results=None):
+        """
+        Cache the results of match, and the words without their terminating char
+        @param max_entries: max number of cached queries
+        @param max_results: max number of words in all cached results
+        """
+        with self._writeLock:
+            self._words = [word[:-1] for word in self.wordList]
+            self.cache = QueryCache(max_entries, max_results)
+
+    ## instrumentation
+
+    def enable_stats(self):
+        """
+        Start counting the work done by builds and queries, which is reported by stats()
+        @return: the TreeStats holding the counters
+        """
+        if self.counters is None:
+            self.counters = TreeStats()
+        return self.counters
+
+    def disable_stats(self):
+        self.counters = None
+
+    def add_hook(self, callback, events=None):
+        """
+        Call callback(event, tree, info) on every event in events, all of HOOK_EVENTS if None.
+        Events are not emitted at all while there is no hook.
+        """
+        if events is not None:
+            unknown = set(events).difference(HOOK_EVENTS)
+            if unknown:
+                raise ValueError(f"Unknown events {sorted(unknown)}, expected some of {HOOK_EVENTS}")
+            events = frozenset(events)
+        self.hooks.append((callback, events))
+
+    def remove_hook(self, callback):
+        self.hooks = [hook for hook in self.hooks if hook[0] is not callback]
+
+    def _emit(self, event, **info):
+        for callback, events in self.hooks:
+            if events is None or event in events:
+                callback(event, self, info)
+
+    def _observe(self, method, pattern, query, *args):
+        """
+        Run a query, counting it and calling the query hooks with the time it took and the nodes it visited
+        """
+        counters = self.counters
+        if counters is not None:
+            visited, scanned = counters.nodes_visited, counters.leaves_scanned
+        start = time.perf_counter()
+        result = query(*args)
+        info = {"method": method, "pattern": pattern, "seconds": time.perf_counter() - start,
+                "results": result if isinstance(result, int) else len(result)}
+        if counters is not None:
+            counters.queries += 1
+            # NOTE: includes the nodes visited by concurrent queries, if any
+            info["nodes_visited"] = counters.nodes_visited - visited
+            info["leaves_scanned"] = counters.leaves_scanned - scanned
+        if self.hooks:
+            self._emit("query", **info)
+        return result
+
+    def stats(self):
+        """
+        @return: dict of the number of nodes of each kind and an estimate of the bytes they take,
+                along with the counters if enabled
+        """
+        nodes = leaves = origins = 0
+        leafBytes = internalBytes = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            nodeOrigins = sum(1 for _ in self._nodeOrigins(node))
+            if nodeOrigins:
+                leaves += 1
+                origins += nodeOrigins
+                leafBytes += self._nodeBytes(node)
+            else:
+                internalBytes += self._nodeBytes(node)
+                stack.extend(self._nodeChildren(node))
+        result = {
+            "nodes": nodes,
+            "leaves": leaves,
+            "internal": nodes - leaves,
+            "origins": origins,
+            "leaf_bytes": leafBytes,
+            "internal_bytes": internalBytes,
+            "origin_bytes": origins * self._originBytes(),
+        }
+        if self.counters is not None:
+            result.update(self.counters.as_dict())
+        return result
+
+    def _nodeBytes(self, node):
+        """
+        @return: estimate of the bytes taken by node and its children table, without its suffix origins
+        """
+        size = sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+        children = node.children
+        if children is not None:
+            size += sys.getsizeof(children) + sys.getsizeof(node._childlist)
+            if isinstance(children, SuffixTreeNode.LookupList):
+                size += sys.getsizeof(children.__dict__) + sys.getsizeof(children.list)
+        return size
+
+    def _originBytes(self):
+        origin = SuffixTreeNode.SuffixOrigin(0, 0)
+        return sys.getsizeof(origin) + sys.getsizeof(origin.__dict__)
+
+    def normalize(self, pattern):
+        """
+        Convert the case of a query pattern like the words in the tree
+        """
+        return pattern if self.case_sensitive else pattern.lower()
+
+    @classmethod
+    def from_file(cls, path, encoding="utf-8", **kwargs):
+        """
+        Build from a file of line separated words, read line by line instead of all at once
+        @param kwargs: other arguments of the constructor
+        """
+        return cls(readWords(path, encoding), **kwargs)
 
-        appendTermChar = lambda s:s+termChar if s[-1] != termChar else s
-        convertCase = (lambda s:s) if case_sensitive else (lambda s:s.lower())
-        self.preprocess = lambda s: convertCase(appendTermChar(s))
+    def preprocess(self, word):
+        """
+        Append the terminating char to word, and convert its case if not case sensitive
+        """
+        if word[-1:] != self.termChar:
+            word += self.termChar
+        return word if self.case_sensitive else word.lower()
 
-        self.wordList = mapl(self.preprocess, wordList)
-        self.termChar = termChar
-        self.root = SuffixTreeNode(alphabetMax=self.alphabetMax, alphabetLookup=alphabetLookup)
+    def _initStorage(self):
+        """
+        Allocate the root node, which is where every suffix extension starts from
+        """
+        self.root = SuffixTreeNode(alphabetMax=self.alphabetMax, alphabetLookup=self.alphabetLookup)
         self.root.link = self.root # root link to itself
-        for word_index in tqdm(range(len(self.wordList))):
-            self._add(word_index)
-            # print(self.wordList[word_index])
+
+    ## node protocol, for the algorithms shared with other node storages
+
+    def _nodeChildren(self, node):
+        return node.getChildren()
+
+    def _nodeOrigins(self, node):
+        """
+        @return: iterator of (wordID, suffixIndex) of the suffixes ending at node, empty if not a leaf
+        """
+        suffixOrigin = node.suffixOrigin if node.isLeaf() else None
+        while suffixOrigin is not None:
+            yield suffixOrigin.wordID, suffixOrigin.suffixIndex
+            suffixOrigin = suffixOrigin.next
+
+    def _nodeRank(self, node):
+        return node.rank
+
+    def _setNodeRank(self, layout, node, rank):
+        node.rank = rank
+
+    def _newLayout(self):
+        return MatchLayout()
+
+    def finalize(self, order=None):
+        """
+        Store for every node the smallest suffixIndex of each word below it, so that Phase 2 of match becomes a slice
+        instead of a traversal of the whole subtree. It takes more memory the longer the words are, as a word appears
+        below every node on the path of each of its suffixes. Adding words afterwards discards the layout, so it should be called again once done adding.
+        @param order: None, "length" or "lex", to sort the words stored for each node in that order, so that
+                match with the same order and a limit only takes the first words of the slice
+        """
+        with self._writeLock: # nothing is added meanwhile, as the layout would miss it for good
+            start = time.perf_counter()
+            with self._writing():
+                self.layout = None # the ranks of the previous layout, if any, are overwritten
+            layout = self._newLayout()
+            layout.order = order
+            wordKey = self._wordKey(order) if order else None
+            matchWord, matchIndex = layout.matchWord, layout.matchIndex
+
+            def emit(rank, result_dict):
+                layout.matchStart[rank] = len(matchWord)
+                if wordKey is None:
+                    matchWord.extend(result_dict.keys())
+                    matchIndex.extend(result_dict.values())
+                else:
+                    for wordID in sorted(result_dict, key=wordKey):
+                        matchWord.append(wordID)
+                        matchIndex.append(result_dict[wordID])
+                layout.matchEnd[rank] = len(matchWord)
+
+            # iterative post order traversal, where each node leaves the {wordID: suffixIndex} of its subtree in results
+            results = []
+            stack = [(self.root, None, None)]
+            while stack:
+                node, childCount, rank = stack.pop()
+                if childCount is None: # first visit
+                    rank = len(layout.matchStart)
+                    self._setNodeRank(layout, node, rank)
+                    layout.matchStart.append(0)
+                    layout.matchEnd.append(0)
+
+                    result_dict = {}
+                    for wordID, suffixIndex in self._nodeOrigins(node):
+                        if wordID not in result_dict or suffixIndex < result_dict[wordID]:
+                            result_dict[wordID] = suffixIndex
+                    if result_dict: # leaf
+                        emit(rank, result_dict)
+                        results.append(result_dict)
+                    else:
+                        children = list(self._nodeChildren(node))
+                        stack.append((node, len(children), rank))
+                        stack.extend((child, None, None) for child in reversed(children))
+                else:
+                    # merge the results of the children into the largest one
+                    childResults = results[len(results)-childCount:]
+                    del results[len(results)-childCount:]
+                    childResults.sort(key=len)
+                    result_dict = childResults.pop() if childResults else {}
+                    for childResult in childResults:
+                        for wordID, suffixIndex in childResult.items():
+                            if wordID not in result_dict or suffixIndex < result_dict[wordID]:
+                                result_dict[wordID] = suffixIndex
+                    emit(rank, result_dict)
+                    results.append(result_dict)
+
+            with self._writing():
+                self.layout = layout
+            if self.hooks:
+                self._emit("finalize", order=order, nodes=len(layout.matchStart), seconds=time.perf_counter() - start)
+
+    def _locate(self, pattern, path=None):
+        """
+        Traverse from the root to the node whose edge contains the end of pattern
+        @param path: optional list of (depth, node) on the path of pattern, to resume the traversal from the last one,
+                where depth is the number of chars of pattern consumed to reach the end of the edge of node.
+                Every node whose edge is fully matched by pattern gets appended to it
+        @return: the node, or None if pattern is not a substring of any word
+        """
+        i, currNode = path[-1] if path else (0, self.root)
+        pWordList = self.wordList # preprocessed word list by GST
+        counters = self.counters
+        while i < len(pattern):
+            c = pattern[i]
+            if currNode.hasChild(c):
+                currNode = currNode.getChild(c)
+                if counters is not None:
+                    counters.nodes_visited += 1
+                edgeSize = currNode.getEdgeSize()
+                wordID = currNode.suffixOrigin.wordID
+                istart = currNode.istart
+
+                cmplen = min(len(pattern) - i, edgeSize) # comparison length
+                if pattern[i:i+cmplen] != pWordList[wordID][istart:istart+cmplen]: # one lookup of the word per edge
+                    return None
+                i += cmplen
+                if path is not None and cmplen == edgeSize:
+                    path.append((i, currNode))
+            else:
+                return None # no match
+        return currNode
 
     def _getMatch(self, startNode, result_accumulator):
-        def traverse(currNode):
+        visited = scanned = 0
+        stack = [startNode]
+        while stack:
+            currNode = stack.pop()
+            visited += 1
             if currNode.isLeaf():
+                scanned += 1
                 suffixOrigin = currNode.suffixOrigin
                 while suffixOrigin is not None: # multiple words can have the same suffix, so need to loop through all
                     wordID = suffixOrigin.wordID
@@ -138,101 +815,790 @@ class GeneralizedSuffixTree:
                         result_accumulator[wordID] = suffixIndex
                     suffixOrigin = suffixOrigin.next
             else:
-                for childNode in currNode.getChildren():
-                    traverse(childNode) # assignment to result is unnecessary
-        traverse(startNode)
+                stack.extend(currNode.getChildren())
+        if self.counters is not None:
+            self.counters.add(nodes_visited=visited, leaves_scanned=scanned)
         return result_accumulator
 
-    def match(self, pattern, ret_match_index=False):
+    def _getFirstMatches(self, startNode, pattern, limit):
+        """
+        Like _getMatch, but stop as soon as limit words are found.
+        As the first suffix found for a word may not be the one with the smallest suffixIndex, the match index is
+        searched in the word instead.
+        """
+        removed = self.removed
+        result_dict = {}
+        visited = 0
+        stack = [startNode]
+        while stack and len(result_dict) < limit:
+            currNode = stack.pop()
+            visited += 1
+            for wordID, _ in self._nodeOrigins(currNode):
+                if wordID not in result_dict and wordID not in removed:
+                    result_dict[wordID] = self.wordList[wordID].find(pattern)
+                    if len(result_dict) == limit:
+                        break
+            stack.extend(self._nodeChildren(currNode))
+        if self.counters is not None:
+            self.counters.nodes_visited += visited
+        return result_dict
+
+    def _wordKey(self, order, id2word=None):
+        """
+        @param id2word: function mapping a wordID to its word, _id2word by default
+        @return: function mapping a wordID to its sort key for the given order
+        """
+        id2word = id2word or self._id2word()
+        if order == "length":
+            return lambda i:(len(self.wordList[i]), id2word(i))
+        elif order == "lex":
+            return id2word
+        raise ValueError(f"Unknown order {order!r}, expected 'length' or 'lex'")
+
+    def _wordRanks(self, order):
+        """
+        @return: array of the rank of every wordID among all the words in order, so that views are sorted by comparing
+                ints instead of words. It is computed once, then extended with the words added since.
+        """
+        count = len(self.wordList)
+        cached = self._ranks.get(order)
+        if cached is not None and cached[0] == count:
+            return cached[2]
+        # NOTE: words from wordList rather than _id2word, as its cache lags behind wordList while words are added
+        self._ranks[order] = cached = rankWords(cached, count, self._wordKey(order, lambda i:self.wordList[i][:-1]))
+        return cached[2]
+
+    def _matchItems(self, node, pattern=None, limit=None, order=None):
+        """
+        Phase 2 of match
+        @return: iterable of (wordID, suffixIndex) for every word below node, with the smallest suffixIndex
+        """
+        removed = self.removed
+        notRemoved = lambda item:item[0] not in removed
+
+        layout = self.layout
+        if layout is not None:
+            items = layout.matches(self._nodeRank(node))
+            if removed:
+                items = filter(notRemoved, items)
+            if order is not None and order != layout.order:
+                itemKey = compose(self._wordKey(order), lambda x:x[0])
+                return heapq.nsmallest(limit, items, itemKey) if limit is not None else sorted(items, key=itemKey)
+            return itertools.islice(items, limit)
+
+        if order is None:
+            if limit is not None:
+                return self._getFirstMatches(node, pattern, limit).items()
+            items = self._getMatch(node, {}).items()
+            return filter(notRemoved, items) if removed else items
+
+        items = self._getMatch(node, {}).items()
+        if removed:
+            items = filter(notRemoved, items)
+        itemKey = compose(self._wordKey(order), lambda x:x[0])
+        return heapq.nsmallest(limit, items, itemKey) if limit is not None else sorted(items, key=itemKey)
+
+    def match(self, pattern, ret_match_index=False, limit=None, order=None, lazy=False):
         """
         Match the substring pattern with all words in the Generalized Suffix Tree
         @param pattern: substring pattern to match the words in the tree
         @param ret_match_index: Whether the output should include the starting index
                 of each word that matches the pattern
+        @param limit: max number of words to return, the search stops once found if there is no order
+        @param order: None, "length" or "lex", to sort the words from the shortest or alphabetically.
+                With limit, only the first words in that order are returned,
+                which is a plain slice if the tree is finalized with the same order
+        @param lazy: whether to return a MatchView, which only decodes the words accessed, and is not cached
         @return: list of words that contains the pattern substring in the tree:
                 either [word,...], or [(word, match_index),...]
 
         Phase 1: traverse to node corresponding to the pattern
-        Phase 2: search all leaves from that node recursively to get match
+        Phase 2: search all leaves from that node to get match, or slice the layout if finalized
         """
+        pattern = self.normalize(pattern)
+        query, args = (self._read, (self._lazyMatch,)) if lazy else (self._cachedMatch, ())
+        if self.counters is not None or self.hooks:
+            return self._observe("match", pattern, query, *args, pattern, ret_match_index, limit, order)
+        return query(*args, pattern, ret_match_index, limit, order)
+
+    def _cachedMatch(self, pattern, ret_match_index, limit, order):
+        cache = self.cache
+        if cache is None:
+            return self._read(self._match, pattern, ret_match_index, limit, order)
+
+        key = (pattern, ret_match_index, limit, order)
+        result = cache.get(key)
+        if result is None:
+            generation = cache.generation
+            result = tuple(self._read(self._match, pattern, ret_match_index, limit, order))
+            cache.put(key, result, generation)
+        return list(result)
+
+    def _match(self, pattern, ret_match_index, limit, order):
         if pattern == "" or pattern == self.termChar:
             return []
 
         ### Phase 1 ###
-        currNode = self.root
-        pWordList = self.wordList # preprocessed word list by GST
-        i = 0
-        while i < len(pattern):
-            c = pattern[i]
-            if currNode.hasChild(c):
-                currNode = currNode.getChild(c)
-                edgeSize = currNode.getEdgeSize()
-                wordID = currNode.suffixOrigin.wordID
-                istart = currNode.istart
+        currNode = self._locate(pattern)
+        if currNode is None:
+            return [] # no match
 
-                cmplen = min(len(pattern) - i, edgeSize) # comparison length
-                for k in range(cmplen):
-                    if pattern[i+k] != pWordList[wordID][istart+k]:
-                        return []
-                i += cmplen
-            else:
-                return [] # no match
+        ### Phase 2 ###
+        return self._formatMatch(self._matchItems(currNode, pattern, limit, order), ret_match_index)
+
+    def _lazyMatch(self, pattern, ret_match_index, limit, order):
+        currNode = None if pattern == "" or pattern == self.termChar else self._locate(pattern)
+        if currNode is None:
+            return MatchView(self, array('i'), array('i'), ret_match_index)
+
+        layout = self.layout
+        if layout is not None and not self.removed:
+            # the words of the node are contiguous in the layout, so copy them without creating any object
+            rank = self._nodeRank(currNode)
+            lo, hi = layout.matchStart[rank], layout.matchEnd[rank]
+            if order in (None, layout.order):
+                hi = hi if limit is None else min(hi, lo + limit)
+                return MatchView(self, layout.matchWord[lo:hi], layout.matchIndex[lo:hi], ret_match_index)
+            return MatchView(self, layout.matchWord[lo:hi], layout.matchIndex[lo:hi], ret_match_index).sorted(order, limit)
+        if order is None:
+            return MatchView.fromItems(self, self._matchItems(currNode, pattern, limit), ret_match_index)
+        return MatchView.fromItems(self, self._matchItems(currNode), ret_match_index).sorted(order, limit)
+
+    def count(self, pattern):
+        """
+        Count the words that contain the substring pattern, in O(len(pattern)) if the tree is finalized
+        """
+        pattern = self.normalize(pattern)
+        if self.counters is not None or self.hooks:
+            return self._observe("count", pattern, self._read, self._count, pattern)
+        return self._read(self._count, pattern)
+
+    def _count(self, pattern):
+        if pattern == "" or pattern == self.termChar:
+            return 0
+        currNode = self._locate(pattern)
+        if currNode is None:
+            return 0
+        removed = self.removed
+        layout = self.layout
+        if layout is not None:
+            rank = self._nodeRank(currNode)
+            if removed:
+                return sum(1 for wordID in layout.matchWord[layout.matchStart[rank]:layout.matchEnd[rank]] if wordID not in removed)
+            return layout.matchEnd[rank] - layout.matchStart[rank]
+        wordIDs = self._getMatch(currNode, {})
+        return sum(1 for wordID in wordIDs if wordID not in removed) if removed else len(wordIDs)
+
+    def remove(self, word):
+        """
+        Tombstone every occurrence of word, so that it is no longer matched right away,
+        while its suffixes stay in the tree as garbage until compact() is called
+        @return: number of occurrences of word removed
+        """
+        word = self.preprocess(word)
+        with self._writeLock:
+            node = self._locate(word)
+            wordIDs = [] if node is None else \
+                [wordID for wordID, suffixIndex in self._nodeOrigins(node) if suffixIndex == 0 and wordID not in self.removed]
+            self.removed.update(wordIDs)
+            self.garbage.update(wordIDs)
+            if self.cache is not None:
+                self.cache.clear()
+
+        threshold = self.compact_threshold
+        if threshold is not None and self.garbage_ratio >= threshold and self._compaction is None:
+            self.compact(background=True)
+        return len(wordIDs)
+
+    @property
+    def garbage_ratio(self):
+        """
+        Ratio of removed words among the words whose suffixes are in the tree
+        """
+        inTree = len(self.wordList) - len(self.removed) + len(self.garbage)
+        return len(self.garbage) / inTree if inTree else 0.0
+
+    # attributes replaced by compact(), which together hold the suffixes of the tree
+    _storageAttributes = ("root", "layout")
+
+    def _compacted(self, wordIDs):
+        """
+        @return: copy of the tree sharing the same wordList and settings, but only storing the given words
+        """
+        tree = copy.copy(self)
+        tree.hooks = [] # the build of the copy is reported as a single compact event
+        tree._writeLock, tree._seqLock = threading.Lock(), threading.Lock()
+        tree.layout = None
+        tree._initStorage()
+        tree._addAll(wordIDs)
+        return tree
+
+    def compact(self, background=False):
+        """
+        Rebuild the tree without the removed words and swap it in, keeping the same wordIDs.
+        Queries keep being served by the current tree while the new one is built.
+        @param background: whether to build in a thread, which is returned
+        """
+        if background:
+            # NOTE: a local, as the thread sets _compaction back to None once done, maybe before start() returns
+            thread = self._compaction = threading.Thread(target=self.compact, daemon=True)
+            thread.start()
+            return thread
+
+        try:
+            start = time.perf_counter()
+            count, termChar = len(self.wordList), self.termChar
+            garbage = set(self.garbage)
+            removed = set(self.removed)
+            tree = self._compacted([wordID for wordID in range(count) if wordID not in removed])
+
+            with self._writeLock:
+                if termChar != self.termChar: # replaced while building, so the edges may be inconsistent
+                    garbage = set(self.garbage)
+                    tree = self._compacted([wordID for wordID in range(len(self.wordList)) if wordID not in self.removed])
+                else: # catch up with the words added while building
+                    tree._addAll(range(count, len(self.wordList)))
+                if self.layout is not None:
+                    tree.finalize(self.layout.order)
+                with self._writing():
+                    self.layout = None
+                    for name in self._storageAttributes:
+                        setattr(self, name, getattr(tree, name))
+                self.garbage -= garbage
+            if self.hooks:
+                self._emit("compact", words=len(garbage), seconds=time.perf_counter() - start)
+        finally:
+            self._compaction = None
+
+    def _id2word(self):
+        """
+        @return: function mapping a wordID to the word without its terminating char
+        """
+        words = self._words
+        if words is not None:
+            return words.__getitem__
+        return lambda i:self.wordList[i][:-1] # ignore the term char
+
+    def _formatMatch(self, items, ret_match_index):
+        """
+        Convert the (wordID, suffixIndex) found in Phase 2 to the output of match
+        """
+        id2word = self._id2word()
+        # NOTE: comprehensions rather than composed lambdas, as decoding a word already costs a call
+        if ret_match_index:
+            return [(id2word(wordID), suffixIndex) for wordID, suffixIndex in items]
+        return [id2word(wordID) for wordID, _ in items]
+
+    def match_many(self, patterns, ret_match_index=False, as_generator=False):
+        """
+        Match many substring patterns in one call, which is faster than calling match on each of them:
+        identical patterns are only matched once, the traversal to the nodes of patterns sharing a prefix is shared
+        by visiting them in sorted order, and patterns ending on the same node share their leaves search.
+        Like match, the results go through the cache if enabled, and every pattern is reported to the query hooks.
+        @param patterns: iterable of substring patterns
+        @param as_generator: whether to return a generator which only searches the leaves of a pattern when its
+                result is requested
+        @return: the result of match for every pattern, in the same order as patterns
+        """
+        patterns = mapl(self.normalize, patterns)
+        counters, cache = self.counters, self.cache
+        if counters is not None:
+            counters.queries += len(patterns)
+        cached = {} # pattern -> result found in the cache, or put in it by this call
+        if cache is not None:
+            generation = cache.generation
+            for pattern in set(patterns):
+                result = cache.get((pattern, ret_match_index, None, None))
+                if result is not None:
+                    cached[pattern] = result
+
+        ### Phase 1 ###
+        def locateAll():
+            """
+            @return: the version of the tree, and the node of every pattern not in the cache
+            """
+            version = self._version
+            path = [(0, self.root)]
+            prevPattern = ""
+            nodes = {} # pattern -> node
+            for pattern in sorted(set(patterns).difference(cached)):
+                # go back up to the deepest node shared with the previous pattern
+                sharedLength = len(os.path.commonprefix((prevPattern, pattern)))
+                while path[-1][0] > sharedLength:
+                    path.pop()
+                if pattern != "" and pattern != self.termChar:
+                    nodes[pattern] = self._locate(pattern, path)
+                prevPattern = pattern
+            return version, nodes
 
         ### Phase 2 ###
-        result_dict = {}
-        self._getMatch(currNode, result_dict)
+        nodeItems = {} # node -> (wordID, suffixIndex) found in Phase 2
+        def match(pattern, version, nodes):
+            if pattern in cached:
+                return list(cached[pattern])
+            node = nodes.get(pattern)
+            try:
+                items = nodeItems[node] if node in nodeItems else [] if node is None else list(self._matchItems(node))
+            except Exception:
+                if self._version == version:
+                    raise
+            if self._version != version: # written since Phase 1, so the nodes may be stale
+                return self._read(self._match, pattern, ret_match_index, None, None)
+            nodeItems[node] = items
+            result = self._formatMatch(items, ret_match_index)
+            if cache is not None:
+                cached[pattern] = tuple(result)
+                cache.put((pattern, ret_match_index, None, None), cached[pattern], generation)
+            return result
+
+        def results(version, nodes):
+            for pattern in patterns:
+                if not self.hooks:
+                    yield match(pattern, version, nodes)
+                    continue
+                # NOTE: the time and counters of a pattern leave out Phase 1, which is shared by the whole batch
+                if counters is not None:
+                    visited, scanned = counters.nodes_visited, counters.leaves_scanned
+                start = time.perf_counter()
+                result = match(pattern, version, nodes)
+                info = {"method": "match", "pattern": pattern, "seconds": time.perf_counter() - start,
+                        "results": len(result)}
+                if counters is not None:
+                    info["nodes_visited"] = counters.nodes_visited - visited
+                    info["leaves_scanned"] = counters.leaves_scanned - scanned
+                self._emit("query", **info)
+                yield result
+
+        # NOTE: only Phase 1 runs in _read, as results already falls back to match for the patterns whose nodes
+        # are stale, and retrying it would report them to the hooks twice
+        results = results(*self._read(locateAll))
+        return results if as_generator else list(results)
+
+    ## approximate matching
+
+    def _edges(self, node, depth, firstSymbols=None):
+        """
+        @param depth: length of the path of node
+        @param firstSymbols: only the children whose edge starts with one of them, default to all children
+        @return: iterator of (child, symbols on its edge) of node
+        """
+        if firstSymbols is None:
+            children = self._nodeChildren(node)
+        else:
+            children = filter(None.__ne__, map(functools.partial(self._nodeChild, node), firstSymbols))
+        for child in children:
+            seq, istart, iend = self._nodeEdge(child)
+            yield child, seq[istart:iend+1]
+
+    def match_fuzzy(self, pattern, max_edits=1, limit=None, wildcard="?"):
+        """
+        Match the words having a substring at most max_edits insertions, deletions or substitutions away from
+        pattern, where wildcard stands for any char, so that max_edits=0 is a plain wildcard search
+        @param limit: max number of words to return, the ones with the fewest edits
+        @param wildcard: char of pattern matching any char, None for none
+        @return: list of (word, match_index, edits) with the fewest edits of each word, fewest first
+
+        Phase 1: search the tree depth first with the row of the edit distance table between pattern and the path
+                 so far, pruning a branch once no distance in the row is small enough, as they only grow down.
+                 Once a mismatch would be too many, only the children starting with a char of pattern are searched
+        Phase 2: collect the words below every node where a whole row matched, from the fewest edits
+        """
+        pattern = self.normalize(pattern)
+        if self.counters is not None or self.hooks:
+            return self._observe("match_fuzzy", pattern, self._read, self._matchFuzzy, pattern, max_edits, limit, wildcard)
+        return self._read(self._matchFuzzy, pattern, max_edits, limit, wildcard)
+
+    def _matchFuzzy(self, pattern, max_edits, limit, wildcard):
+        if pattern == "":
+            return []
+
+        ### Phase 1 ###
+        term = self._scanSymbols(self.termChar)[0]
+        symbols = self._scanSymbols(pattern)
+        anyChar = [c == wildcard for c in pattern]
+        m = len(pattern)
+        counters = self.counters
+        row = list(range(m + 1)) # edits between the first j chars of pattern and the path, the empty one at the root
+        hits = {} # node -> fewest edits between pattern and a point on its edge
+        if row[m] <= max_edits: # short enough to delete it all, so every word matches
+            hits[self.root] = row[m]
+        # a branch is searched while it can match with fewer edits than bound, and fewer than the match above it
+        stack = [(self.root, 0, row, min(row[m], max_edits + 1))]
+        while stack:
+            node, depth, row, bound = stack.pop()
+            firstSymbols = None
+            if min(row) + 1 >= bound: # the next char must match a char of pattern, after as few edits as row has
+                matchable = [j for j in range(m) if row[j] < bound]
+                if not any(anyChar[j] for j in matchable):
+                    firstSymbols = {symbols[j] for j in matchable}
+            for child, edge in self._edges(node, depth, firstSymbols):
+                if counters is not None:
+                    counters.nodes_visited += 1
+                childRow, childBound = row, bound
+                for c in edge:
+                    if c == term:
+                        break
+                    prev, childRow = childRow, [childRow[0] + 1]
+                    left = childRow[0]
+                    for j in range(m):
+                        edits = prev[j] if anyChar[j] or symbols[j] == c else prev[j] + 1
+                        if prev[j+1] < edits:
+                            edits = prev[j+1] + 1
+                        if left < edits:
+                            edits = left + 1
+                        childRow.append(edits)
+                        left = edits
+                    if childRow[m] < childBound:
+                        childBound = hits[child] = childRow[m]
+                    if min(childRow) >= childBound:
+                        break
+                else:
+                    stack.append((child, depth + len(edge), childRow, childBound))
+
+        ### Phase 2 ###
+        id2word = self._id2word()
+        best = {} # wordID -> (match_index, edits)
+        hitList = sorted(hits.items(), key=lambda hit: hit[1])
+        for i, (node, edits) in enumerate(hitList):
+            for wordID, suffixIndex in self._matchItems(node):
+                if wordID not in best or best[wordID][1] == edits and suffixIndex < best[wordID][0]:
+                    best[wordID] = (suffixIndex, edits)
+            if limit is not None and len(best) >= limit and (i+1 == len(hitList) or hitList[i+1][1] > edits):
+                break # the words with the fewest edits are all found
+        result = [(id2word(wordID), suffixIndex, edits) for wordID, (suffixIndex, edits) in best.items()]
+        result.sort(key=lambda x: x[2])
+        return result[:limit]
+
+    ## scanning a text for the words
+
+    def _nodeChild(self, node, symbol):
+        return node.getChild(symbol)
+
+    def _nodeEdge(self, node):
+        """
+        @return: (sequence, istart, iend) such that the edge of node is sequence[istart:iend+1]
+        """
+        return self.wordList[node.suffixOrigin.wordID], node.istart, node.iend
+
+    def _nodeLink(self, node):
+        return node.link
+
+    def _scanSymbols(self, text):
+        """
+        @return: text as the chars on the edges, to be compared with them
+        """
+        return self.normalize(text)
+
+    def _wordAncestors(self):
+        """
+        Index of the internal nodes whose path is a whole word, those having a terminating child with the origin of
+        a word at suffixIndex 0, each pointing to the nearest one above it
+        @return: ({node: (wordIDs of its path, nearest such node above or None)},
+                  {internal node: nearest such node at or above it})
+        """
+        term = self._scanSymbols(self.termChar)[0]
+        ends, nearest = {}, {}
+        stack = [(child, None) for child in self._nodeChildren(self.root)]
+        while stack:
+            node, above = stack.pop()
+            children = list(self._nodeChildren(node))
+            if not children: # leaf
+                continue
+            termChild = self._nodeChild(node, term)
+            if termChild is not None:
+                wordIDs = [wordID for wordID, suffixIndex in self._nodeOrigins(termChild) if suffixIndex == 0]
+                if wordIDs:
+                    ends[node] = (wordIDs, above)
+                    above = node
+            if above is not None:
+                nearest[node] = above
+            stack.extend((child, above) for child in children)
+        return ends, nearest
+
+    def scan(self, chunks):
+        """
+        Find every occurrence of the words in a text given in chunks, so that it can be larger than memory.
+        It computes the matching statistics of the text: from each offset, the longest prefix M of the text that is
+        a substring of the words, found from the locus of M at the previous offset by following its suffix link,
+        so that the whole text takes linear time. The words occurring at an offset are the prefixes of M, whose
+        paths end on the path of M: at the deepest node of it, then up by the nearest word ancestor pointers.
+        Only the text from the current offset is kept, so memory is bounded by the chunk size and the longest word.
+        The tree must not be modified while scanning.
+
+        @param chunks: iterable of str, such as readChunks(path), or a str
+        @return: generator of (offset in the text, wordID) of every occurrence, by offset then longest word first
+        """
+        if isinstance(chunks, str):
+            chunks = (chunks,)
+        chunks = iter(chunks)
+        index = self._scanIndex
+        if index is None or index[0] != self._version:
+            index = self._scanIndex = self._read(lambda: (self._version, *self._wordAncestors()))
+        version, ends, nearest = index
+        return self._scan(chunks, version, ends, nearest)
+
+    def _scan(self, chunks, version, ends, nearest):
+        term = self._scanSymbols(self.termChar)[0]
+        removed = self.removed
+        nodeChild, nodeEdge, nodeLink = self._nodeChild, self._nodeEdge, self._nodeLink
+        root = self.root
+
+        buf = self._scanSymbols("") # text from offset bufStart
+        bufStart = 0
+        exhausted = False
+        node, depth = root, 0 # deepest node on the path of M, and the length of its path
+        child, r = None, 0 # M ends r chars down the edge of child, if r > 0
+        seq = estart = eend = edgeLength = None # edge of child
+        length = 0 # length of M
+        i = 0 # offset of M in the text
+
+        while True:
+            # extend M as long as the text follows an edge
+            while True:
+                j = i + length - bufStart
+                if j >= len(buf):
+                    if exhausted:
+                        break
+                    chunk = next(chunks, None)
+                    if self._version != version:
+                        raise RuntimeError("Tree modified during scan")
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    buf = buf[i - bufStart:] + self._scanSymbols(chunk) # drop the text before M
+                    bufStart = i
+                    continue
+                c = buf[j]
+                if c == term:
+                    break
+                if r == 0:
+                    child = nodeChild(node, c)
+                    if child is None:
+                        break
+                    seq, estart, eend = nodeEdge(child)
+                    edgeLength = eend - estart + 1
+                elif seq[estart + r] != c:
+                    break
+                r += 1
+                length += 1
+                if r == edgeLength: # NOTE: never a leaf, as the text cannot match its terminating char
+                    node, depth, r = child, depth + edgeLength, 0
+
+            if length == 0:
+                if exhausted and i >= bufStart + len(buf):
+                    return
+                i += 1
+                continue
+
+            # M is a whole word if only the terminating char follows it on a leaf edge
+            if r > 0 and r == edgeLength - 1 and seq[eend] == term:
+                for wordID, suffixIndex in self._nodeOrigins(child):
+                    if suffixIndex == 0 and wordID not in removed:
+                        yield i, wordID
+            # shorter words end at the nodes above
+            wordNode = nearest.get(node)
+            while wordNode is not None:
+                wordIDs, wordNode = ends[wordNode]
+                for wordID in wordIDs:
+                    if wordID not in removed:
+                        yield i, wordID
+
+            # drop the first char of M, then walk down the chars of M past the linked node, skipping whole edges
+            i += 1
+            length -= 1
+            if depth == 0:
+                r -= 1
+            else:
+                node = nodeLink(node)
+                depth -= 1
+            while r > 0:
+                child = nodeChild(node, buf[i + depth - bufStart])
+                seq, estart, eend = nodeEdge(child)
+                edgeLength = eend - estart + 1
+                if r < edgeLength:
+                    break
+                node, depth, r = child, depth + edgeLength, r - edgeLength
+
+    ## common substrings
+
+    def _annotate(self, wordIDs=None):
+        """
+        Bottom-up pass computing, for every node, the number of distinct words below it as the number of suffixes
+        below it minus the duplicates: in depth first order, a suffix of a word seen before is a duplicate at the
+        deepest node above both, found by binary search on the times the nodes on the path were entered
+        @param wordIDs: set of the words to count, default to all but the removed ones
+        @return: generator of (depth, count, wordID, suffixIndex) in post order of every node whose path is followed
+                 by different chars in the words, the end of a word being one, so not the root, the leaves whose path
+                 is the same as their parent's, and the nodes found in other words only
+        """
+        removed = self.removed
+        selected = (lambda wordID: wordID not in removed) if wordIDs is None else wordIDs.__contains__
+        last = {} # wordID -> time its last suffix was seen
+        path = [[0, 0, 0, -1, 0, 0]] # [depth, count, duplicates, wordID, suffixIndex, max count of a child] of the nodes being visited
+        times = [0] # time each node of path was entered
+        clock = 1
+        stack = [(child, 0) for child in self._nodeChildren(self.root)]
+        while stack:
+            node, parentDepth = stack.pop()
+            if node is None: # all children of the last node of path are done
+                depth, count, duplicates, wordID, suffixIndex, childCount = path.pop()
+                times.pop()
+                count -= duplicates
+                if count > childCount: # otherwise the path of the node is always followed by the same char
+                    yield depth, count, wordID, suffixIndex
+                extends = True
+            else:
+                seq, istart, iend = self._nodeEdge(node)
+                children = list(self._nodeChildren(node))
+                if children:
+                    depth = parentDepth + iend - istart + 1
+                    path.append([depth, 0, 0, -1, 0, 0])
+                    times.append(clock)
+                    clock += 1
+                    stack.append((None, depth))
+                    stack.extend((child, depth) for child in children)
+                    continue
+                depth = parentDepth + iend - istart # without the terminating char
+                count, wordID, suffixIndex = 0, -1, 0
+                for originWord, originSuffix in self._nodeOrigins(node):
+                    if selected(originWord):
+                        count += 1
+                        if originWord in last:
+                            path[bisect_right(times, last[originWord]) - 1][2] += 1
+                        last[originWord] = clock
+                        wordID, suffixIndex = originWord, originSuffix
+                clock += 1
+                extends = depth > parentDepth # not just the terminating char
+                if count and extends:
+                    yield depth, count, wordID, suffixIndex
+            if count:
+                parent = path[-1]
+                parent[1] += count
+                if parent[3] < 0:
+                    parent[3], parent[4] = wordID, suffixIndex
+                if extends and count > parent[5]:
+                    parent[5] = count
+
+    def annotate(self):
+        """
+        Compute what common substring queries need over all words, which is done on first use and again once words
+        are added or removed
+        @return: SubstringCounts
+        """
+        key = (self._version, len(self.removed))
+        annotation = self._substringCounts
+        if annotation is None or annotation[0] != key:
+            annotation = self._substringCounts = self._read(lambda: ((self._version, len(self.removed)), SubstringCounts(self._annotate())))
+        return annotation[1]
+
+    def _substringCountsOf(self, word_ids):
+        """
+        @return: (SubstringCounts of the words, number of them), all but the removed ones if word_ids is None
+        """
+        if word_ids is None:
+            return self.annotate(), len(self.wordList) - len(self.removed)
+        wordIDs = set(word_ids) - self.removed
+        return self._read(lambda: SubstringCounts(self._annotate(wordIDs))), len(wordIDs)
+
+    def _substring(self, counts, i):
+        suffixIndex = counts.suffixIndex[i]
+        return self.wordList[counts.wordID[i]][suffixIndex:suffixIndex + counts.depth[i]]
 
-        out_format = lambda x:x if ret_match_index else lambda x:x[0]
-        mapfst = lambda f: lambda x:(f(x[0]), x[1])
-        id2word = lambda i:self.wordList[i][:-1] # ignore the term char
+    def longest_common_substring(self, word_ids=None, k=None):
+        """
+        @param word_ids: wordIDs of the words to compare, default to all words
+        @param k: number of these words the substring must be in, default to all of them
+        @return: the longest substring of at least k of the words, "" if there is none
+        """
+        counts, total = self._substringCountsOf(word_ids)
+        k = total if k is None else k
+        best, bestDepth = None, 0
+        for i, (depth, count) in enumerate(zip(counts.depth, counts.count)):
+            if depth > bestDepth and count >= k:
+                best, bestDepth = i, depth
+        return "" if best is None else self._substring(counts, best)
+
+    def common_substrings(self, k, min_length=1, word_ids=None):
+        """
+        Substrings in at least k words, only the longest of those that are in exactly the same words as they share a
+        node of the tree, e.g. not "ab" if every word with "ab" has "abc"
+        @param word_ids: wordIDs of the words to compare, default to all words
+        @return: list of (substring, number of words it is in), longest first then most common first
+        """
+        counts, _ = self._substringCountsOf(word_ids)
+        found = [(depth, count, i) for i, (depth, count) in enumerate(zip(counts.depth, counts.count))
+                 if depth >= min_length and count >= k]
+        found.sort(key=lambda x: (-x[0], -x[1]))
+        return [(self._substring(counts, i), count) for depth, count, i in found]
+
+    ## building, shared by every node storage through the methods below, and createLeaf, splitEdge and walkDown
+
+    def _wordSymbols(self, wordID):
+        """
+        @return: (sequence, start, length) such that the symbols of the word are sequence[start:start+length],
+                which are the indexes the edges of its suffixes are made of
+        """
+        word = self.wordList[wordID] # looked up once, as every lookup slices it out of its chunk
+        return word, 0, len(word)
 
-        postprocess = compose(out_format, mapfst(id2word))
+    def _edgeSymbol(self, node, k):
+        """
+        @return: the k-th symbol on the edge of node
+        """
+        return self.wordList.charAt(node.suffixOrigin.wordID, node.istart + k)
+
+    def _edgeSize(self, node):
+        return node.getEdgeSize()
+
+    def _addNodeOrigin(self, node, wordID, suffixIndex):
+        node.addSuffixOrigin(wordID, suffixIndex)
 
-        # convert wordID to word from wordList, while retaining the suffixIndex
-        return mapl(postprocess, result_dict.items())
+    def _setNodeLink(self, node, linkedNode):
+        node.link = linkedNode
 
-    def createLeaf(self, wordID, sourceNode, istart, suffixIndex, firstChar):
+    def createLeaf(self, wordID, sourceNode, istart, suffixIndex, firstChar, lastIndex):
         """
         Create a leaf braching from sourceNode, with end index set to the last index of the string because
         A LEAF IS ALWAYS A LEAF
 
         @param istart: starting index of the substring on this node
         @param suffixIndex: the suffix index represented by this leaf
+        @param lastIndex: index of the terminating char of the word
         """
-        lastIndex = len(self.wordList[wordID]) - 1
         leaf = SuffixTreeNode(wordID, istart, lastIndex, True, suffixIndex,
                                 alphabetMax=self.alphabetMax, alphabetLookup=self.alphabetLookup)
         sourceNode.setChild(firstChar, leaf)
         return leaf
 
-    def splitEdge(self, currNode, parentNode, conflictIndex, goodCount, suffixIndex, wordID):
+    def splitEdge(self, currNode, parentNode, conflictIndex, goodCount, suffixIndex, wordID, currWord):
         """
         A new internal node will be created between current node and its parent node
 
         @param conflictIndex: the index of the last char in current suffix extension [j..i], which is i
         @param goodCount: number of char before conflict happens in the current edge of node, which is i-j
         @param suffixIndex: suffix index of the new leaf to be created
+        @param currWord: the word of wordID
         @return: newly constructed internalNode, new leaf ignored as it can care for itself,
                 such that all future RULE 1 are implicitly handled
         """
-        currWord = self.wordList[wordID]
-        existingWord = self.wordList[currNode.suffixOrigin.wordID]
+        existingWordID = currNode.suffixOrigin.wordID
+        charAt = self.wordList.charAt
 
         # create the 2 new nodes
-        internalNode = SuffixTreeNode(currNode.suffixOrigin.wordID, currNode.istart, currNode.istart + goodCount - 1,
+        internalNode = SuffixTreeNode(existingWordID, currNode.istart, currNode.istart + goodCount - 1,
                                         alphabetMax=self.alphabetMax, alphabetLookup=self.alphabetLookup)
-        newLeaf = self.createLeaf(wordID, internalNode, conflictIndex, suffixIndex, currWord[conflictIndex])
+        newLeaf = self.createLeaf(wordID, internalNode, conflictIndex, suffixIndex, currWord[conflictIndex], len(currWord) - 1)
 
         # link the created internal node
-        parentNode.setChild(existingWord[currNode.istart], internalNode)
+        parentNode.setChild(charAt(existingWordID, currNode.istart), internalNode)
 
         # make changes to currNode and link to internal node
         currNode.istart += goodCount
-        internalNode.setChild(existingWord[currNode.istart], currNode)
+        internalNode.setChild(charAt(existingWordID, currNode.istart), currNode)
 
         return internalNode
 
-    def walkDown(self, startNode, iend, skipCount, wordID):
+    def walkDown(self, startNode, iend, skipCount, currWord):
         """
         Walk down from startNode and skip skipCount number of chars until the EDGE that can fit the requirement is reached.
         if skipCount > 0, then the current node will traverse to its child,
@@ -244,8 +1610,6 @@ class GeneralizedSuffixTree:
         @return parentNode: not none if traversal to child has happened
         @return remainingSkip: remaining skip available after reaching the destination edge
         """
-        currWord = self.wordList[wordID]
-
         istart = iend - skipCount
         remainingSkip = skipCount
         currNode = startNode
@@ -273,20 +1637,114 @@ class GeneralizedSuffixTree:
 
     def add(self, word):
         """
-        !NOTE: Not working when using alphabet lookup table or with max alphabet list
+        Append a new word to the tree. A char unseen so far grows the alphabet lookup table,
+        or makes the nodes it branches from fall back to a dict if beyond the max alphabet
         """
-        word = self.preprocess(word)
-        self.wordList.append(word)
-        wordID = len(self.wordList) - 1
-        self._add(wordID)
+        self.add_many([word])
+
+    # number of words read at once by add_many, which are checked against the terminating char together
+    addChunkSize = 10000
+    # whether add_many adds each chunk to the tree as soon as it is read, rather than all words once read
+    addInChunks = True
+
+    def add_many(self, words, progress_bar=False):
+        """
+        Append new words to the tree, reading them chunk by chunk so that any iterable can be streamed
+        """
+        total = len(words) if hasattr(words, "__len__") else None
+        words = iter(words)
+        with self._writeLock, tqdm(total=total, disable=not progress_bar) as progress:
+            progress = None if progress.disable else progress
+            startTime = time.perf_counter()
+            if self.hooks:
+                self._emit("build_start", total=total)
+            start = added = len(self.wordList)
+            for chunk in iter(lambda: list(itertools.islice(words, self.addChunkSize)), []):
+                self._checkTermChar(chunk)
+                self.wordList.extend(map(self.preprocess, chunk))
+                if self.layout is not None:
+                    with self._writing():
+                        self.layout = None # no longer up to date
+                if self.addInChunks:
+                    self._addAll(range(added, len(self.wordList)), progress)
+                    added = len(self.wordList)
+            self._addAll(range(added, len(self.wordList)), progress)
+            if self.cache is not None:
+                self.cache.clear() # after the words are in, so results computed meanwhile are not kept
+            if self.hooks:
+                self._emit("build_end", words=len(self.wordList) - start, seconds=time.perf_counter() - startTime)
+
+    def _addAll(self, wordIDs, progress=None):
+        """
+        @param progress: tqdm bar updated for every word added
+        """
+        hooks = self.hooks
+        seqLock, words = self._seqLock, self._words
+        for wordID in wordIDs:
+            # NOTE: same as self._writing(), inlined as it is entered for every word
+            with seqLock:
+                self._version += 1
+                try:
+                    if words is not None and len(words) == wordID: # see _cacheWords
+                        words.append(self.wordList[wordID][:-1])
+                    self._add(wordID)
+                finally:
+                    self._version += 1
+            if progress is not None:
+                progress.update()
+            if hooks:
+                self._emit("build_progress", wordID=wordID, words=1)
+
+    def _cacheWords(self, end):
+        """
+        Append the words up to wordID end to the cached words, if enabled, which must be done in the write section
+        making them reachable, so that queries never find a wordID missing from the cache
+        """
+        words = self._words
+        if words is not None and len(words) < end:
+            words.extend(self.wordList[wordID][:-1] for wordID in range(len(words), end))
+
+    def _checkTermChar(self, words):
+        """
+        Replace the terminating char if it is used by any of the words about to be added,
+        since a word must not contain it
+        """
+        # NOTE: the words in wordList are already converted, the new ones must be converted before looking for
+        # the highest char, since converting can move a char past the max of the raw words, e.g. "Ż" to "ż"
+        words = [self.normalize(word) for word in words]
+        if not any(self.termChar in word for word in words):
+            return
+        newTermChar = chr(max(max(map(ord, word), default=0) for word in itertools.chain(self.wordList, words)) + 1)
+        self._replaceTermChar(newTermChar if self.case_sensitive else caseFreeChar(newTermChar))
+
+    def _replaceTermChar(self, newTermChar):
+        oldTermChar = self.termChar
+        with self._writing():
+            self.wordList.replaceTermChar(oldTermChar, newTermChar)
+            self.termChar = newTermChar
+            self.layout = None
+            self._renameTermEdges(oldTermChar, newTermChar)
+
+    def _renameTermEdges(self, oldTermChar, newTermChar):
+        """
+        Move the children starting with the old terminating char to the new one
+        """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not node.isLeaf():
+                node.replaceChildChar(oldTermChar, newTermChar)
+                stack.extend(node.getChildren())
 
     def _add(self, wordID):
         """
-        Append a new word using its index to the Generalized Suffix Tree with Ukkonen's Algorithm
+        Append a new word using its index to the Generalized Suffix Tree with Ukkonen's Algorithm.
+        The node storages share it through the node protocol, only providing the steps on their nodes.
         """
-        #txt = self.wordList[wordID]
-        currWord = self.wordList[wordID]
-        n = len(currWord)
+        seq, start, n = self._wordSymbols(wordID)
+        root = self.root
+        nodeChild, edgeSymbol, nodeLink, setNodeLink = self._nodeChild, self._edgeSymbol, self._nodeLink, self._setNodeLink
+        walkDown = self.walkDown
 
         # initialize extension istart value
         istart = 0
@@ -295,64 +1753,62 @@ class GeneralizedSuffixTree:
         # and is awaiting to be linked up in the following extension of its creation
         nodeToLink = None
 
-        currNode = self.root
+        currNode = root
         skipCount = 0
 
         nextSkipCount = 0
 
+        # counted in locals, and only added to the counters once done if enabled
+        extensions = links = skipped = splits = 0
+
         # phase iend
         for iend in range(n):
 
+            # the index in seq of the char we want to see if matches with the one on the edge
+            queryIndex = start + iend
+            querySymbol = seq[queryIndex]
+
+            termCharReached = iend == n-1
+
             # extension istart
             while istart <= iend:
-                if self.print_progress:
-                    printHighlight(self.wordList[wordID], istart, iend+1)
+                extensions += 1
 
                 suffixIndex = istart # for readability
 
-                if currNode.isRoot():
+                if currNode == root:
                     skipCount = iend - istart
 
-                currNode, parentNode, remainingSkip \
-                    = self.walkDown(currNode, iend, skipCount, wordID)
+                currNode, parentNode, remainingSkip = walkDown(currNode, queryIndex, skipCount, seq)
+                skipped += skipCount - remainingSkip
 
                 ## WE HAVE REACHED THE DESIRED EDGE FROM THIS POINT ONWARDS ##
 
-                # the index of char we want to see if matches with the one on the edge
-                queryIndex = iend
-
                 newInternalNode = None
 
-                termCharReached = iend == n-1
-
                 if remainingSkip == 0:
-                    targetFirstChar = currWord[queryIndex]
-                    if not currNode.hasChild(targetFirstChar):
-                        self.createLeaf(wordID, currNode, queryIndex, suffixIndex, targetFirstChar)
+                    childNode = nodeChild(currNode, querySymbol)
+                    if childNode is None:
+                        self.createLeaf(wordID, currNode, queryIndex, suffixIndex, querySymbol, start + n - 1)
                         nextSkipCount = 0 # not walked up one edge, so nothing to skip
                     elif termCharReached: # NOTE: GST extension
                         # Identical suffixes of different words encountered, add the new wordID to the leaf
                         # CASE 1: terminating node at child
-                        termNode = currNode.getChild(targetFirstChar) # targetFirstChar is terminating char
-                        termNode.addSuffixOrigin(wordID, suffixIndex)
+                        self._addNodeOrigin(childNode, wordID, suffixIndex) # querySymbol is terminating char
                         nextSkipCount = 0
                     else:
                         nextSkipCount = 1 # RULE 3
                 else:
-                    # actual index of char on the edge
-                    edgeIndex = currNode.istart + remainingSkip
-                    existingWord = self.wordList[currNode.suffixOrigin.wordID]
-
                     # split edge if char at query index mismatch with the one present in the edge
-                    if currWord[queryIndex] != existingWord[edgeIndex]:
-                        newInternalNode = self.splitEdge(currNode, parentNode, queryIndex, remainingSkip, suffixIndex, wordID)
-                        nextSkipCount = newInternalNode.getEdgeSize() # newInternalNode.iend - newInternalNode.istart + 1
+                    if querySymbol != edgeSymbol(currNode, remainingSkip):
+                        newInternalNode = self.splitEdge(currNode, parentNode, queryIndex, remainingSkip, suffixIndex, wordID, seq)
+                        splits += 1
+                        nextSkipCount = remainingSkip # edge size of newInternalNode
                     elif termCharReached: # NOTE: GST extension
                         # Identical suffixes of different words encountered, add the new wordID to the leaf
                         # CASE 2: current node is terminating node
-                        termNode = currNode # terminating node contains terminating char
-                        termNode.addSuffixOrigin(wordID, suffixIndex)
-                        nextSkipCount = termNode.getEdgeSize() - 1 # -1 to exlude the terminating char, as if split with term char happened
+                        self._addNodeOrigin(currNode, wordID, suffixIndex)
+                        nextSkipCount = self._edgeSize(currNode) - 1 # -1 to exlude the terminating char, as if split with term char happened
                     else:
                         nextSkipCount = remainingSkip + 1 # RULE 3
 
@@ -364,25 +1820,72 @@ class GeneralizedSuffixTree:
                     #   after it has been created
                     currNode = parentNode # this allows us to guarantee linkableNode has link
 
-                if nodeToLink:
-                    nodeToLink.link = newInternalNode if newInternalNode else currNode
+                if nodeToLink is not None:
+                    setNodeLink(nodeToLink, currNode if newInternalNode is None else newInternalNode)
                 nodeToLink = newInternalNode # update nodeToLink
 
                 skipCount = nextSkipCount
 
                 # is RULE2
-                if skipCount == 0 or newInternalNode or termCharReached: # NOTE: GST extension
-                    currNode = currNode.link # go across link
+                if skipCount == 0 or newInternalNode is not None or termCharReached: # NOTE: GST extension
+                    links += currNode != root
+                    currNode = nodeLink(currNode) # go across link
                     istart += 1 # increment extension
                 else: # is RULE 3
                     break
 
+        if self.counters is not None:
+            self.counters.add(words=1, extensions=extensions, link_traversals=links, walkdown_skips=skipped, split_edges=splits)
+
+
+def readWords(path, encoding="utf-8"):
+    """
+    Generate the line separated words of a file one by one, without their trailing whitespace
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            yield line.decode(encoding).rstrip()
+
+def readChunks(path, size=1 << 20, encoding="utf-8"):
+    """
+    Generate the text of a file size chars at a time, to be scanned
+    """
+    with open(path, encoding=encoding, newline="") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+def caseFreeChar(char):
+    """
+    @return: char, or the first char after it which is the same in lower case, so that it can terminate the words
+            of a case insensitive tree without being converted along with them
+    """
+    while char.lower() != char:
+        char = chr(ord(char) + 1)
+    return char
+
+def rankWords(cached, count, key):
+    """
+    Rank the first count wordIDs, only sorting the words added since the cached ranks and merging them in
+    @param cached: (number of words, wordIDs in order, rank of every wordID) of the words ranked before, or None
+    @param key: function mapping a wordID to its sort key
+    @return: (count, wordIDs in order, rank of every wordID) of the first count wordIDs
+    """
+    ranked, ordered = (0, array('i')) if cached is None else cached[:2]
+    added = sorted(range(ranked, count), key=key)
+    ordered = array('i', heapq.merge(ordered, added, key=key) if ranked else added)
+    ranks = array('i', [0]) * count
+    for rank, wordID in enumerate(ordered):
+        ranks[wordID] = rank
+    return count, ordered, ranks
 
 def getAlphabetTable(wordList):
     """
-    Get the alphabet used in txt to speed up suffix tree traversal
+    Get the alphabet used in txt to speed up suffix tree traversal, in a single pass over any iterable of words
     """
-    alphaUsed = {ord(c) for txt in wordList for c in txt}
+    alphaUsed = set()
+    for txt in wordList:
+        alphaUsed.update(txt)
+    alphaUsed = set(map(ord, alphaUsed))
     termChar = max(alphaUsed) + 1
     alphaUsed.add(termChar)
     termChar = chr(termChar)
@@ -0,0 +1,38 @@
+import unittest
+
+from suffix_tree import GeneralizedSuffixTree
+from compact_suffix_tree import CompactGeneralizedSuffixTree
+from encoded_suffix_tree import EncodedGeneralizedSuffixTree
+from suffix_array import GeneralizedSuffixArray
+from benchmarks import benchmark_suite
+
+ENGINES = (GeneralizedSuffixTree, CompactGeneralizedSuffixTree, EncodedGeneralizedSuffixTree, GeneralizedSuffixArray)
+
+def naiveMatch(wordList, pattern):
+    return sorted(word.lower() for word in wordList if pattern.lower() in word.lower())
+
+class TermCharTest(unittest.TestCase):
+
+    def test_case_insensitive_add_of_term_char(self):
+        # NOTE: "Ż" and "Ā" are converted to chars above their own code point, so the new terminating char must
+        # be computed from the converted words
+        for cls in ENGINES:
+            for termChar, words in (("$", ["Ż$"]), ("$", ["aĀ$"]), (chr(256), ["aĀ" + chr(256)])):
+                with self.subTest(engine=cls.__name__, words=words):
+                    tree = cls(["abc"], termChar=termChar, progress_bar=False)
+                    tree.add_many(words)
+                    wordList = ["abc"] + words
+                    self.assertNotIn(tree.termChar, "".join(word.lower() for word in wordList))
+                    for pattern in ("a", "ż", "Ā", "$", "c", termChar):
+                        self.assertEqual(sorted(tree.match(pattern)), naiveMatch(wordList, pattern))
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_suite_mixed_case_is_not_wrong(self):
+        wordList = ["Banana", "bANDANA", "Ünter", "über", "CAB", "abc"]
+        for result in benchmark_suite(wordList, ["ba", "BA", "Ban", "ÜB", "ab", "nter"], memory=False, check=6):
+            with self.subTest(engine=result["engine"]):
+                self.assertEqual(result["wrong"], 0)
+
+if __name__ == "__main__":
+    unittest.main()